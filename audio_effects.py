@@ -0,0 +1,213 @@
+"""
+JalebiJams - batched audio effects
+A pluggable chain of effects (gain, fades, limiter) run with NumPy over
+blocks of 20 ms PCM frames. EffectsTransformer is a drop-in replacement
+for discord.PCMVolumeTransformer: it reads a batch of frames from FFmpeg,
+runs the chain over the whole block, then hands the frames out one at a
+time. Buffers are allocated once per source, so the hot path only creates
+the bytes object discord.py needs for each frame.
+"""
+
+import numpy as np
+import discord
+from discord.opus import Encoder
+
+FRAME_BYTES = Encoder.FRAME_SIZE  # 3840 bytes: 20 ms of 48 kHz stereo s16le
+FRAME_VALUES = Encoder.SAMPLES_PER_FRAME * Encoder.CHANNELS  # int16 values per frame
+
+
+class Effect:
+    """One stage of an EffectsChain.
+
+    process() edits block, a (frames, FRAME_VALUES) float32 view, in place;
+    position is the track frame index of the block's first row.
+    """
+
+    enabled = True
+
+    def process(self, block, position: int, chain: 'EffectsChain'):
+        raise NotImplementedError
+
+
+class Gain(Effect):
+    """Linear gain. Changes are ramped across the next block instead of stepping (no zipper noise)."""
+
+    def __init__(self, value: float = 1.0):
+        self.value = value
+        self._applied = value
+
+    def process(self, block, position, chain):
+        target = self.value
+        if target == self._applied:
+            if target != 1.0:
+                np.multiply(block, target, out=block)
+            return
+        chain.ramp(self._applied, target, len(block))
+        chain.apply_edges(block)
+        self._applied = target
+
+
+class Fade(Effect):
+    """Linear fade in (or out) over frames, starting at track frame start."""
+
+    def __init__(self, start: int, frames: int, fade_in: bool = True):
+        self.start = start
+        self.frames = max(1, frames)
+        self.fade_in = fade_in
+
+    def process(self, block, position, chain):
+        n = len(block)
+        done = position >= self.start + self.frames
+        if done or position + n <= self.start:
+            if done == self.fade_in:
+                return  # fully faded in, or not yet fading out
+            block.fill(0.0)
+            return
+        edges = chain.edges[:n + 1]
+        np.add(chain.index[:n + 1], position - self.start, out=edges)
+        np.multiply(edges, 1.0 / self.frames, out=edges)
+        np.clip(edges, 0.0, 1.0, out=edges)
+        if not self.fade_in:
+            np.subtract(1.0, edges, out=edges)
+        chain.apply_edges(block)
+
+
+class Limiter(Effect):
+    """Peak limiter: keeps every frame under ceiling_db (dBFS).
+
+    Gain is computed per frame and ramped across it, so it is already down
+    when a loud frame starts (the batch gives a frame of look-ahead); it then
+    recovers by release_db per frame. Anything the ramp misses is clipped by
+    the transformer.
+    """
+
+    def __init__(self, ceiling_db: float = -1.0, release_db: float = 0.5):
+        self.ceiling = 32767.0 * 10 ** (ceiling_db / 20)
+        self.release = 10 ** (release_db / 20)
+        self.gain = 1.0
+
+    def process(self, block, position, chain):
+        n = len(block)
+        peaks = chain.peaks[:n]
+        np.max(np.abs(block, out=chain.scratch[:n]), axis=1, out=peaks)
+        if self.gain >= 1.0 and peaks.max() <= self.ceiling:
+            return
+        np.maximum(peaks, 1.0, out=peaks)
+        np.divide(self.ceiling, peaks, out=peaks)  # per-frame gain that would just reach the ceiling
+        edges = chain.edges
+        previous = self.gain
+        for i in range(n):  # n is the batch size, not the sample count
+            gain = min(float(peaks[i]), previous * self.release, 1.0)
+            edges[i] = min(previous, gain)
+            previous = gain
+        edges[n] = previous
+        self.gain = previous
+        chain.apply_edges(block)
+
+
+class EffectsChain:
+    """Ordered effects plus the scratch buffers they share, sized for batch frames."""
+
+    def __init__(self, effects=(), batch: int = 10):
+        self.effects = list(effects)
+        self.batch = batch
+        self.index = np.arange(batch + 1, dtype=np.float32)
+        self.edges = np.empty(batch + 1, dtype=np.float32)  # gain at each frame boundary
+        self.slopes = np.empty(batch, dtype=np.float32)
+        self.peaks = np.empty(batch, dtype=np.float32)
+        self.scratch = np.empty((batch, FRAME_VALUES), dtype=np.float32)
+        self.envelope = np.empty((batch, FRAME_VALUES), dtype=np.float32)
+        half = FRAME_VALUES // Encoder.CHANNELS
+        # position of every interleaved value within its frame, 0 -> 1 (both channels share a step)
+        self.within = np.repeat(np.arange(half, dtype=np.float32) / half, Encoder.CHANNELS)
+
+    def add(self, effect: Effect):
+        self.effects.append(effect)
+
+    def remove(self, effect: Effect):
+        self.effects.remove(effect)
+
+    def ramp(self, start: float, end: float, frames: int):
+        """Fill edges with a straight line from start to end over frames."""
+        edges = self.edges[:frames + 1]
+        np.multiply(self.index[:frames + 1], (end - start) / frames, out=edges)
+        np.add(edges, start, out=edges)
+
+    def apply_edges(self, block):
+        """Scale block by a gain moving linearly from edges[i] to edges[i + 1] across frame i."""
+        n = len(block)
+        edges, slopes, envelope = self.edges, self.slopes[:n], self.envelope[:n]
+        np.subtract(edges[1:n + 1], edges[:n], out=slopes)
+        np.multiply(slopes[:, None], self.within, out=envelope)
+        np.add(envelope, edges[:n, None], out=envelope)
+        np.multiply(block, envelope, out=block)
+
+    def process(self, block, position: int):
+        for effect in self.effects:
+            if effect.enabled:
+                effect.process(block, position, self)
+
+
+class EffectsTransformer(discord.AudioSource):
+    """Drop-in for discord.PCMVolumeTransformer that runs an EffectsChain over batches of frames.
+
+    volume is the first stage of the chain; effects run after it.
+    """
+
+    def __init__(self, original, volume: float = 1.0, *, batch: int = 10, effects=()):
+        if not isinstance(original, discord.AudioSource):
+            raise TypeError(f'expected AudioSource not {original.__class__.__name__}.')
+        if original.is_opus():
+            raise discord.ClientException('AudioSource must not be Opus encoded.')
+        self.original = original
+        self._gain = Gain(max(volume, 0.0))
+        self.chain = EffectsChain([self._gain, *effects], batch)
+        self._raw = bytearray(batch * FRAME_BYTES)
+        self._pcm = np.frombuffer(self._raw, dtype=np.int16).reshape(batch, FRAME_VALUES)
+        self._work = np.empty((batch, FRAME_VALUES), dtype=np.float32)
+        self._out = np.empty((batch, FRAME_VALUES), dtype=np.int16)
+        self._ready = 0
+        self._next = 0
+        self._position = 0  # track frames run through the chain
+        self._eof = False
+
+    @property
+    def volume(self) -> float:
+        return self._gain.value
+
+    @volume.setter
+    def volume(self, value: float):
+        self._gain.value = max(value, 0.0)
+
+    def cleanup(self):
+        self.original.cleanup()
+
+    def _read_batch(self):
+        raw = memoryview(self._raw)
+        n = 0
+        while n < self.chain.batch:
+            frame = self.original.read()
+            if len(frame) != FRAME_BYTES:
+                self._eof = True  # FFmpegPCMAudio drops a short final frame too
+                break
+            raw[n * FRAME_BYTES:(n + 1) * FRAME_BYTES] = frame
+            n += 1
+        if n:
+            work = self._work[:n]
+            np.copyto(work, self._pcm[:n])
+            self.chain.process(work, self._position)
+            np.clip(work, -32768.0, 32767.0, out=work)
+            np.copyto(self._out[:n], work, casting='unsafe')
+            self._position += n
+        self._ready, self._next = n, 0
+
+    def read(self) -> bytes:
+        if self._next >= self._ready:
+            if self._eof:
+                return b''
+            self._read_batch()
+            if not self._ready:
+                return b''
+        frame = self._out[self._next].tobytes()
+        self._next += 1
+        return frame
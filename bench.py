@@ -0,0 +1,468 @@
+"""
+JalebiJams - offline benchmark suite
+Measures the resolution, playlist and queueing hot paths of bot.py without
+touching the network: yt-dlp is replaced by a stub extractor and the
+Invidious/Piped fallbacks by a local stand-in HTTP server with configurable
+latency and failure rates. Also measures the CPU per guild of the per-frame
+volume transformer against the batched NumPy effects chain.
+
+Usage:
+    python bench.py                       # run every scenario
+    python bench.py -s dead_primary -n 50 # one scenario, 50 resolutions
+    python bench.py --save bench_baseline.json
+    python bench.py --compare bench_baseline.json
+    python bench.py -s warm_cache --effects-seconds 600  # longer effects run
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import string
+import asyncio
+import argparse
+import platform
+import math
+from array import array
+
+# Keep the bot module from touching disk or opening ports while benchmarking
+os.environ['AUDIO_CACHE_MB'] = '0'
+os.environ['RESOLVE_CACHE_FILE'] = ''
+os.environ['HEALTH_FILE'] = ''
+os.environ['SNAPSHOT_FILE'] = ''
+os.environ['LOUDNESS_NORMALIZE'] = '0'
+os.environ['TRACE_FILE'] = ''
+os.environ['METRICS_PORT'] = '0'
+os.environ.setdefault('PREFETCH_DEPTH', '1')
+
+import discord
+from aiohttp import web
+from yt_dlp.utils import DownloadError
+
+import bot
+
+BENCH_PORT = 18765
+INVIDIOUS_STUBS = ['inv0', 'inv1', 'inv2', 'inv3']
+PIPED_STUBS = ['piped0', 'piped1', 'piped2']
+
+# Each scenario describes the stub extractor and every stand-in host.
+# host behaviour: latency (s), fail_rate (0-1), mode 'error' (HTTP 502) or 'hang' (never answers in time)
+SCENARIOS = {
+    'cold_cache': {
+        'description': 'yt-dlp healthy, every request is a new video',
+        'primary': {'latency': 0.15, 'fail_rate': 0.0},
+        'hosts': {},
+        'cache': False,
+    },
+    'warm_cache': {
+        'description': 'yt-dlp healthy, popular tracks requested repeatedly',
+        'primary': {'latency': 0.15, 'fail_rate': 0.0},
+        'hosts': {},
+        'cache': True,
+        'distinct_ids': 5,
+    },
+    'dead_primary': {
+        'description': 'yt-dlp blocked, healthy Invidious fallback',
+        'primary': {'latency': 0.05, 'fail_rate': 1.0},
+        'hosts': {},
+        'cache': False,
+    },
+    'slow_fallbacks': {
+        'description': 'yt-dlp blocked, first Invidious hosts hang or fail',
+        'primary': {'latency': 0.05, 'fail_rate': 1.0},
+        'hosts': {
+            'inv0': {'latency': 5.0, 'mode': 'hang'},
+            'inv1': {'latency': 0.05, 'fail_rate': 1.0, 'mode': 'error'},
+            'inv2': {'latency': 0.3, 'fail_rate': 0.5, 'mode': 'error'},
+        },
+        'cache': False,
+    },
+    'slow_fallbacks_hedged': {
+        'description': 'slow_fallbacks with RESOLVE_RACE=hedge',
+        'primary': {'latency': 0.05, 'fail_rate': 1.0},
+        'hosts': {
+            'inv0': {'latency': 5.0, 'mode': 'hang'},
+            'inv1': {'latency': 0.05, 'fail_rate': 1.0, 'mode': 'error'},
+            'inv2': {'latency': 0.3, 'fail_rate': 0.5, 'mode': 'error'},
+        },
+        'cache': False,
+        'race': 'hedge',
+    },
+}
+
+DEFAULT_HOST = {'latency': 0.05, 'fail_rate': 0.0, 'mode': 'error'}
+
+
+def random_video_id(rng: random.Random) -> str:
+    return ''.join(rng.choice(string.ascii_letters + string.digits + '-_') for _ in range(11))
+
+
+def stream_url(video_id: str) -> str:
+    return f"https://stub.googlevideo.com/videoplayback?expire={int(time.time()) + 21600}&id={video_id}"
+
+
+class StubYoutubeDL:
+    """Stands in for yt_dlp.YoutubeDL: blocks for the configured latency, then succeeds or fails."""
+
+    config = {'latency': 0.1, 'fail_rate': 0.0}
+    playlist = {'size': 500, 'page_size': 100, 'page_latency': 0.05}
+    rng = random.Random(1)
+
+    def __init__(self, opts=None):
+        self.opts = opts or {}
+
+    def extract_info(self, url, download=False, process=True):
+        if 'list=' in url and not process:
+            return {'title': 'Stub playlist', 'entries': self._playlist_entries()}
+        time.sleep(self.config['latency'])
+        if self.rng.random() < self.config['fail_rate']:
+            raise DownloadError('stub extractor: Sign in to confirm you are not a bot')
+        video_id = bot.extract_video_id(url) or random_video_id(self.rng)
+        return {'id': video_id, 'title': f'Stub {video_id}', 'url': stream_url(video_id),
+                'duration': 200, 'acodec': 'opus'}
+
+    def _playlist_entries(self):
+        size, page_size = self.playlist['size'], self.playlist['page_size']
+        for i in range(size):
+            if i and i % page_size == 0:
+                time.sleep(self.playlist['page_latency'])  # continuation page fetch
+            yield {'id': f'{i:011d}', 'title': f'Playlist track {i}', 'url': f'{i:011d}'}
+
+
+class StubProviders:
+    """Local stand-in for the Invidious /api/v1/videos/{id} and Piped /streams/{id} APIs."""
+
+    def __init__(self):
+        self.hosts = {}
+        self.rng = random.Random(2)
+        self.runner = None
+
+    def configure(self, hosts: dict):
+        self.hosts = {name: {**DEFAULT_HOST, **hosts.get(name, {})} for name in INVIDIOUS_STUBS + PIPED_STUBS}
+
+    async def _behave(self, host: str):
+        cfg = self.hosts.get(host, DEFAULT_HOST)
+        if cfg['mode'] == 'hang':
+            await asyncio.sleep(3600)  # the client's timeout fires first
+        await asyncio.sleep(cfg['latency'])
+        if self.rng.random() < cfg['fail_rate']:
+            return web.Response(status=502)
+        return None
+
+    async def invidious(self, request):
+        failure = await self._behave(request.match_info['host'])
+        if failure is not None:
+            return failure
+        vid = request.match_info['vid']
+        return web.json_response({
+            'title': f'Invidious {vid}',
+            'lengthSeconds': 200,
+            'adaptiveFormats': [
+                {'type': 'audio/webm; codecs="opus"', 'url': stream_url(vid), 'bitrate': '160000'},
+                {'type': 'audio/mp4; codecs="mp4a.40.2"', 'url': stream_url(vid) + '&itag=140', 'bitrate': '128000'},
+            ],
+        })
+
+    async def piped(self, request):
+        failure = await self._behave(request.match_info['host'])
+        if failure is not None:
+            return failure
+        vid = request.match_info['vid']
+        return web.json_response({
+            'title': f'Piped {vid}',
+            'duration': 200,
+            'audioStreams': [{'url': stream_url(vid), 'codec': 'opus', 'bitrate': 160000}],
+        })
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/{host}/api/v1/videos/{vid}', self.invidious)
+        app.router.add_get('/{host}/streams/{vid}', self.piped)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, '127.0.0.1', BENCH_PORT).start()
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+class LoopLagMonitor:
+    """Samples how late a 10ms sleep wakes up, i.e. how long the event loop was blocked."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self.task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def __enter__(self):
+        self.task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self.task.cancel()
+        return False
+
+
+def percentiles(samples, points=(50, 95, 99)) -> dict:
+    if not samples:
+        return {f'p{p}': None for p in points}
+    ordered = sorted(samples)
+    return {f'p{p}': round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 4) for p in points}
+
+
+def reset_bot_state(scenario: dict):
+    """Point bot.py at the stubs and reset caches and pools for one scenario."""
+    base = f'http://127.0.0.1:{BENCH_PORT}'
+    bot.INVIDIOUS_HOST = f'{base}/{INVIDIOUS_STUBS[0]}'
+    bot._INVIDIOUS_DEFAULTS[:] = [f'{base}/{name}' for name in INVIDIOUS_STUBS]
+    bot.PIPED_HOSTS[:] = [f'{base}/{name}' for name in PIPED_STUBS]
+    bot.HTTP_TIMEOUT = 1.0
+    bot.RESOLVE_RACE = scenario.get('race', 'off')
+    bot.RESOLVE_HEDGE_DELAY = scenario.get('hedge_delay', 0.2)
+    bot.resolve_cache.entries.clear()
+    bot.resolve_cache.hits = bot.resolve_cache.misses = 0
+    bot.resolve_cache.max_entries = 512 if scenario.get('cache') else 0
+    bot.provider_health.hosts.clear()
+    bot.extractor_pool.reset()
+    StubYoutubeDL.config = {**StubYoutubeDL.config, **scenario['primary']}
+
+
+async def bench_resolution(scenario: dict, count: int, concurrency: int, rng: random.Random) -> dict:
+    distinct = scenario.get('distinct_ids')
+    ids = [random_video_id(rng) for _ in range(distinct or count)]
+    latencies = []
+    failures = 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal failures
+        vid = ids[i % len(ids)]
+        async with sem:
+            start = time.perf_counter()
+            playable, _, _ = await bot.resolve_audio(f'https://www.youtube.com/watch?v={vid}')
+            latencies.append(time.perf_counter() - start)
+            if not playable:
+                failures += 1
+
+    with LoopLagMonitor() as lag:
+        await asyncio.gather(*(one(i) for i in range(count)))
+    return {
+        'resolutions': count,
+        'failures': failures,
+        'latency': percentiles(latencies),
+        'loop_lag': percentiles(lag.samples),
+        'loop_lag_max': round(max(lag.samples, default=0.0), 4),
+        'cache_hits': bot.resolve_cache.hits,
+    }
+
+
+async def bench_playlist(size: int) -> dict:
+    StubYoutubeDL.playlist = {**StubYoutubeDL.playlist, 'size': size}
+    queue = bot.MusicQueue()
+    start = time.perf_counter()
+    with LoopLagMonitor() as lag:
+        data = await bot.open_playlist('https://www.youtube.com/playlist?list=STUB')
+        feed = bot.PlaylistFeed(data['entries'], data['title'], channel_id=None)
+        await feed.pull(queue, 1)
+        first = time.perf_counter() - start
+        while not feed.exhausted:
+            await feed.pull(queue, bot.MAX_PLAYLIST_ITEMS)
+        total = time.perf_counter() - start
+    return {
+        'entries': len(queue),
+        'time_to_first_entry': round(first, 4),
+        'total_seconds': round(total, 4),
+        'entries_per_second': round(len(queue) / total, 1) if total else None,
+        'loop_lag_max': round(max(lag.samples, default=0.0), 4),
+    }
+
+
+class _NullSource(discord.AudioSource):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def read(self):
+        return b''
+
+
+class _BenchVoiceClient:
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.source = None
+
+    def play(self, source, after=None):
+        self.source = source
+        self.started.set()
+
+    def is_playing(self):
+        return True
+
+
+class _BenchCtx:
+    class guild:
+        id = 0
+
+    def __init__(self):
+        self.voice_client = _BenchVoiceClient()
+
+
+async def bench_transitions(tracks: int, gap: float, rng: random.Random) -> dict:
+    """Time play_next() from the after-callback to voice_client.play(), with `gap` of playback between."""
+    discord.FFmpegPCMAudio = _NullSource
+    bot.music_queues.pop(0, None)
+    queue = bot.get_queue(0)
+    for _ in range(tracks + 1):
+        queue.add(bot.Track(f'https://www.youtube.com/watch?v={random_video_id(rng)}', 'bench', None))
+    ctx = _BenchCtx()
+    latencies = []
+    with LoopLagMonitor() as lag:
+        await bot.play_next(ctx)
+        for _ in range(tracks):
+            await asyncio.sleep(gap)  # the current track "plays" while prefetch works
+            ctx.voice_client.started.clear()
+            start = time.perf_counter()
+            await bot.play_next(ctx)
+            await ctx.voice_client.started.wait()
+            latencies.append(time.perf_counter() - start)
+    queue.clear()
+    return {'transitions': tracks, 'latency': percentiles(latencies),
+            'loop_lag_max': round(max(lag.samples, default=0.0), 4)}
+
+
+class _ToneSource(discord.AudioSource):
+    """Endless near-full-scale PCM (tone plus noise), so effects like the limiter have work to do."""
+
+    def __init__(self, rng: random.Random, distinct: int = 50):
+        self.frames = []
+        for f in range(distinct):
+            values = array('h')
+            for i in range(960):
+                t = (f * 960 + i) / 48000
+                sample = int(26000 * math.sin(2 * math.pi * 220 * t) + rng.uniform(-6000, 6000))
+                values.extend((sample, -sample))
+            self.frames.append(values.tobytes())
+        self.index = 0
+
+    def read(self):
+        frame = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        return frame
+
+
+def bench_effects(seconds: float, batch: int, rng: random.Random) -> dict:
+    """CPU per 20 ms frame of the per-frame PCMVolumeTransformer vs. the batched NumPy chain."""
+    frames = int(seconds * 50)
+    source = _ToneSource(rng)
+    chains = {'source_only': lambda: source, 'pcm_volume': lambda: discord.PCMVolumeTransformer(source, 0.5)}
+    if bot.audio_effects is not None:
+        fx = bot.audio_effects
+        chains['effects_volume'] = lambda: fx.EffectsTransformer(source, 0.5, batch=batch)
+        chains['effects_gain_limiter_fade'] = lambda: fx.EffectsTransformer(
+            source, 0.5, batch=batch, effects=[fx.Gain(2.0), fx.Limiter(-1.0), fx.Fade(0, 50)])
+    else:
+        print('[bench] NumPy not installed; effects chain skipped')
+    result = {'frames': frames, 'batch': batch}
+    for name, build in chains.items():
+        player = build()
+        start = time.process_time()
+        for _ in range(frames):
+            player.read()
+        cpu = time.process_time() - start
+        us = cpu / frames * 1e6
+        # the voice client pulls one frame every 20 ms, so this is the share of one core per guild
+        result[name] = {'us_per_frame': round(us, 2), 'cpu_percent_per_guild': round(us / 200, 3)}
+    return result
+
+
+async def run(args) -> dict:
+    bot._build_ytdl = lambda variant='primary': StubYoutubeDL()
+    bot.load_yt_dlp().YoutubeDL = StubYoutubeDL
+    providers = StubProviders()
+    await providers.start()
+    results = {'python': platform.python_version(), 'scenarios': {}}
+    try:
+        for name in args.scenario or SCENARIOS:
+            scenario = SCENARIOS[name]
+            providers.configure(scenario['hosts'])
+            reset_bot_state(scenario)
+            await bot.close_http_session()
+            rng = random.Random(args.seed)
+            print(f"[bench] {name}: {scenario['description']}")
+            result = {'resolution': await bench_resolution(scenario, args.count, args.concurrency, rng)}
+            if not args.skip_transitions:
+                reset_bot_state(scenario)
+                result['transitions'] = await bench_transitions(args.transitions, args.gap, rng)
+            results['scenarios'][name] = result
+        reset_bot_state(SCENARIOS['cold_cache'])
+        print(f"[bench] playlist ingest: {args.playlist_size} entries")
+        results['playlist'] = await bench_playlist(args.playlist_size)
+        if not args.skip_effects:
+            print(f"[bench] audio effects: {args.effects_seconds:g}s of audio")
+            results['effects'] = bench_effects(args.effects_seconds, args.effects_batch, random.Random(args.seed))
+    finally:
+        await bot.close_http_session()
+        await providers.stop()
+    return results
+
+
+def _flatten(prefix: str, value, out: dict):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f'{prefix}.{k}' if prefix else k, v, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+
+
+def report(results: dict, baseline: dict | None):
+    current, before = {}, {}
+    _flatten('', {k: v for k, v in results.items() if k != 'python'}, current)
+    if baseline:
+        _flatten('', {k: v for k, v in baseline.items() if k != 'python'}, before)
+    width = max(len(k) for k in current)
+    for key, value in current.items():
+        line = f"{key:<{width}}  {value:>10}"
+        old = before.get(key)
+        if old:
+            line += f"  (baseline {old}, {100 * (value - old) / old:+.1f}%)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the JalebiJams hot paths')
+    parser.add_argument('-s', '--scenario', action='append', choices=sorted(SCENARIOS), help='scenario to run (repeatable)')
+    parser.add_argument('-n', '--count', type=int, default=40, help='resolutions per scenario')
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help='concurrent resolve_audio() callers')
+    parser.add_argument('--transitions', type=int, default=8, help='play_next() transitions per scenario')
+    parser.add_argument('--gap', type=float, default=0.5, help='simulated playback seconds between transitions')
+    parser.add_argument('--skip-transitions', action='store_true')
+    parser.add_argument('--playlist-size', type=int, default=500)
+    parser.add_argument('--effects-seconds', type=float, default=120, help='seconds of audio per effects chain')
+    parser.add_argument('--effects-batch', type=int, default=bot.EFFECTS_BATCH_FRAMES, help='frames per NumPy batch')
+    parser.add_argument('--skip-effects', action='store_true')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--save', metavar='PATH', help='write results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare against a saved baseline')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"[bench] baseline saved to {args.save}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
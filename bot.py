@@ -3,33 +3,175 @@ JalebiJams - Discord Music Bot
 A Discord bot that plays YouTube music in voice channels.
 """
 
+import time
+STARTED_AT = time.perf_counter()  # startup phases are reported relative to this
+
 import os
 import re
 import json
 import platform
 import discord
 from discord.ext import commands
-import yt_dlp
 import asyncio
 from dotenv import load_dotenv
 import traceback
 import itertools
-import requests
+import math
+import random
+import aiohttp
+from aiohttp import web
+import threading
+import sys
+import urllib.parse
+import shutil
+import audioop
+import tempfile
+from collections import OrderedDict, deque
+from queue import Queue, Empty
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import sqlite3
+import signal
+import contextlib
+import contextvars
+import secrets
+import extract_worker
+try:
+    import audio_effects  # needs NumPy; without it sources fall back to PCMVolumeTransformer
+except ImportError:
+    audio_effects = None
 
 # Load environment variables
 load_dotenv()
 
+# Fast start: connect to the gateway first, then import yt-dlp and warm the
+# extractors in the background (with a test resolve) once the bot is ready
+FAST_START = os.getenv('FAST_START', '1') == '1'
+WARMUP_RESOLVE = os.getenv('WARMUP_RESOLVE', '1') == '1'
+startup_phases = {}  # phase -> seconds since process start
+
+
+def mark_startup(phase: str):
+    startup_phases[phase] = time.perf_counter() - STARTED_AT
+    print(f"[startup] {phase}: {startup_phases[phase]:.2f}s")
+
+
+yt_dlp = None  # set by load_yt_dlp()
+
+
+def load_yt_dlp():
+    """Import yt-dlp on first use; the import lock serializes concurrent callers."""
+    global yt_dlp
+    if yt_dlp is None:
+        import yt_dlp as module
+        yt_dlp = module
+    return yt_dlp
+
+
+def ytdlp_version() -> str:
+    if yt_dlp is None:
+        return 'not loaded yet'
+    return getattr(yt_dlp, '__version__', getattr(getattr(yt_dlp, 'version', None), '__version__', 'unknown'))
+
+
+if not FAST_START:
+    load_yt_dlp()
+mark_startup('imports')
+
 # Bot configuration
 TOKEN = os.getenv('DISCORD_TOKEN')
 COMMAND_PREFIX = os.getenv('COMMAND_PREFIX', '!')
 
+
+def parse_shard_ids(value: str) -> list | None:
+    """Parse SHARD_IDS like '0,1,2' or '0-3' (empty = all shards)."""
+    ids = []
+    for part in value.replace(' ', '').split(','):
+        if '-' in part:
+            first, last = part.split('-', 1)
+            ids.extend(range(int(first), int(last) + 1))
+        elif part:
+            ids.append(int(part))
+    return ids or None
+
+
+# Sharding: 'off' = one gateway connection, 'auto' = AutoShardedBot in this process.
+# launcher.py runs several processes in 'auto' mode, each with its own SHARD_IDS range.
+SHARDING = os.getenv('SHARDING', 'off').lower()
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0')) or None  # total shards (unset = Discord's recommendation)
+SHARD_IDS = parse_shard_ids(os.getenv('SHARD_IDS', ''))  # shards owned by this process
+
+
+def shard_config_error() -> str | None:
+    """Explain a sharding setup discord.py would reject at login, or None if it is usable."""
+    if SHARDING != 'auto' or not SHARD_IDS:
+        return None
+    if not SHARD_COUNT:
+        return "SHARD_IDS needs SHARD_COUNT (the total across all processes); set both, or run launcher.py to split shards"
+    out_of_range = [i for i in SHARD_IDS if not 0 <= i < SHARD_COUNT]
+    if out_of_range:
+        return f"SHARD_IDS {out_of_range} out of range for SHARD_COUNT={SHARD_COUNT}"
+    return None
+
 # Setup intents
 intents = discord.Intents.default()
 intents.message_content = True
 intents.voice_states = True
 
+
+class JalebiBot(commands.AutoShardedBot if SHARDING == 'auto' else commands.Bot):
+    """Bot that also starts and tears down shared resources."""
+
+    health_task = None
+    warmup_task = None
+    restore_task = None
+    snapshot_task = None
+    trace_task = None
+
+    async def setup_hook(self):
+        await start_metrics_server()
+        loop_watchdog.start()
+        self.health_task = asyncio.create_task(provider_health_loop())
+        if snapshots.path:
+            self.snapshot_task = asyncio.create_task(snapshot_loop())
+        if traces.path:
+            self.trace_task = asyncio.create_task(trace_loop())
+        try:
+            # systemd stops with SIGTERM; close cleanly so the last snapshot is written
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(self.close()))
+        except (NotImplementedError, RuntimeError):
+            pass  # no signal handlers on Windows event loops
+        mark_startup('setup')
+
+    async def close(self):
+        for task in (self.health_task, self.warmup_task, self.restore_task, self.snapshot_task, self.trace_task):
+            if task is not None:
+                task.cancel()
+        await snapshots.flush()  # before super().close() disconnects voice
+        snapshots.close()
+        await traces.flush()
+        provider_health.save_soon()
+        loudness.stop()
+        loudness.save_soon()
+        loop_watchdog.stop()
+        await stop_metrics_server()
+        await close_http_session()
+        if process_extractor is not None:
+            process_extractor.shutdown()
+        await super().close()
+
+
 # Create bot instance
-bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents)
+if shard_config_error():
+    sys.exit(f"Error: {shard_config_error()}")  # discord.py would only fail inside its constructor
+_shard_options = {}
+if SHARDING == 'auto':
+    if SHARD_COUNT:
+        _shard_options['shard_count'] = SHARD_COUNT
+    if SHARD_IDS:
+        _shard_options['shard_ids'] = SHARD_IDS
+bot = JalebiBot(command_prefix=COMMAND_PREFIX, intents=intents, **_shard_options)
 
 # YouTube DL options
 import os.path
@@ -49,6 +191,21 @@ PIPED_HOSTS = [
     'https://piped.lunar.icu'
 ]
 FALLBACK_ONLY = os.getenv('FALLBACK_ONLY', '0') == '1'  # Force using alternative frontends only
+# Provider racing: 'off' = sequential chain, 'hedge' = start fallbacks after RESOLVE_HEDGE_DELAY,
+# 'all' = start every provider at once. First usable URL wins; the rest are cancelled.
+RESOLVE_RACE = os.getenv('RESOLVE_RACE', 'off').lower()
+RESOLVE_HEDGE_DELAY = float(os.getenv('RESOLVE_HEDGE_DELAY', '3'))
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '8'))  # per-request budget for Invidious/Piped calls
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3'))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '32'))  # total pooled connections
+HTTP_POOL_PER_HOST = int(os.getenv('HTTP_POOL_PER_HOST', '4'))
+# Provider health: per-host EWMA success/latency, circuit breaker after repeated failures
+HEALTH_FILE = os.getenv('HEALTH_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'provider_health.json'))
+HEALTH_EWMA_ALPHA = float(os.getenv('HEALTH_EWMA_ALPHA', '0.3'))
+HEALTH_FAILURES = int(os.getenv('HEALTH_FAILURES', '3'))  # consecutive failures that open a host's circuit
+HEALTH_OPEN_SECONDS = int(os.getenv('HEALTH_OPEN_SECONDS', '60'))  # first open period; doubles up to 30 min
+HEALTH_PROBE_INTERVAL = int(os.getenv('HEALTH_PROBE_INTERVAL', '60'))  # seconds between background probes
+PROBE_VIDEO_ID = 'dQw4w9WgXcQ'  # also used by !pingyt
 
 USER_AGENT = os.getenv('YTDLP_USER_AGENT', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_0_0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0 Safari/537.36')
 
@@ -80,6 +237,8 @@ ytdl_format_options = {
         }
     },
     'retries': 3,
+    # Persistent player-JS/signature cache so restarts don't re-download it
+    'cachedir': os.getenv('YTDLP_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ytdlp_cache')),
 }
 
 # Add cookies if file exists
@@ -126,16 +285,858 @@ ffmpeg_options = {
     'options': '-vn'
 }
 
-ytdl = yt_dlp.YoutubeDL(ytdl_format_options)
+
+def ffmpeg_options_for(playable: str, start: float = 0.0, gain_db: float = 0.0) -> dict:
+    """FFmpeg options for a stream URL or a local file (reconnect flags are HTTP-only).
+
+    start seeks the input (-ss before -i) so a resumed track doesn't decode
+    the part that was already played; gain_db adds a volume filter to the
+    decode FFmpeg already does.
+    """
+    options = dict(ffmpeg_options) if '://' in playable else {'options': ffmpeg_options['options']}
+    if start > 0:
+        options['before_options'] = f"{options.get('before_options', '')} -ss {start:.2f}".lstrip()
+    if abs(gain_db) >= 0.1:
+        options['options'] = f"{options['options']} -af volume={gain_db:.1f}dB"
+    return options
 
 # Configuration (can be overridden via environment variables)
-MAX_PLAYLIST_ITEMS = int(os.getenv('MAX_PLAYLIST_ITEMS', '50'))
+MAX_PLAYLIST_ITEMS = int(os.getenv('MAX_PLAYLIST_ITEMS', '50'))  # playlist entries paged into the queue at a time
+PLAYLIST_MAX_TRACKS = int(os.getenv('PLAYLIST_MAX_TRACKS', '1000'))  # overall cap per playlist (0 = no cap)
+PLAYLIST_LOW_WATER = int(os.getenv('PLAYLIST_LOW_WATER', '10'))  # page in more once the queue drains below this
+QUEUE_PAGE_SIZE = int(os.getenv('QUEUE_PAGE_SIZE', '15'))  # tracks per !queue page (keeps messages under 2000 chars)
 FAST_PLAYLIST_MODE = os.getenv('PLAYLIST_MODE', 'fast').lower() == 'fast'  # fast = don't prefetch full metadata
+# Full playlist mode: queued playlist tracks are resolved ahead of playback (durations filled in,
+# unavailable entries dropped) by at most ENRICH_CONCURRENCY resolutions at a time across all guilds
+ENRICH_CONCURRENCY = int(os.getenv('ENRICH_CONCURRENCY', '2'))
+RESOLVE_CACHE_SIZE = int(os.getenv('RESOLVE_CACHE_SIZE', '512'))  # 0 disables the resolved-stream cache
+RESOLVE_CACHE_FILE = os.getenv('RESOLVE_CACHE_FILE', '')  # optional JSON file so restarts don't start cold
+RESOLVE_STORE = os.getenv('RESOLVE_STORE', '')  # SQLite file shared by shard processes (unset = per process)
+RESOLVE_CACHE_MARGIN = int(os.getenv('RESOLVE_CACHE_MARGIN', '120'))  # seconds of slack before a URL's expiry
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '21600'))  # seconds a query -> video ID mapping is reused
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '1024'))
+SEARCH_RESULTS = int(os.getenv('SEARCH_RESULTS', '5'))  # results offered by !search
+SNAPSHOT_FILE = os.getenv('SNAPSHOT_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'playback_state.db'))  # '' disables
+SNAPSHOT_INTERVAL = float(os.getenv('SNAPSHOT_INTERVAL', '5'))  # seconds between snapshots of changed/playing guilds
+SNAPSHOT_MAX_AGE = int(os.getenv('SNAPSHOT_MAX_AGE', '21600'))  # older sessions are dropped instead of resumed
+PREFETCH_DEPTH = int(os.getenv('PREFETCH_DEPTH', '1'))  # upcoming tracks to resolve while one plays (0 = off)
+# Transitions: the next track's FFmpeg starts PREROLL_SECONDS before the current one ends and
+# buffers up to PREROLL_BUFFER_SECONDS of frames (~190 KB/s of PCM per guild) for an instant swap
+PREROLL_SECONDS = float(os.getenv('PREROLL_SECONDS', '5'))  # 0 disables pre-spawning
+PREROLL_FRAMES = int(float(os.getenv('PREROLL_BUFFER_SECONDS', '2')) * 50)  # 20 ms frames
+CROSSFADE_FRAMES = int(float(os.getenv('CROSSFADE_SECONDS', '0')) * 50)  # PCM mode only (0 = hard cut)
+EXTRACTOR_THREADS = int(os.getenv('EXTRACTOR_THREADS', '4'))  # dedicated yt-dlp worker threads
+# Opus passthrough: send YouTube's native Opus packets without PCM decode/re-encode;
+# volume becomes an FFmpeg-side gain applied when the next track starts
+OPUS_PASSTHROUGH = os.getenv('OPUS_PASSTHROUGH', '0') == '1'
+OPUS_BITRATE = int(os.getenv('OPUS_BITRATE', '128'))  # kbps when FFmpeg has to re-encode (gain != 100%)
+AUDIO_EFFECTS = os.getenv('AUDIO_EFFECTS', '1') == '1' and audio_effects is not None  # NumPy effects chain (PCM mode)
+EFFECTS_BATCH_FRAMES = int(os.getenv('EFFECTS_BATCH_FRAMES', '10'))  # 20 ms frames processed per NumPy batch
+LIMITER_CEILING = float(os.getenv('LIMITER_CEILING', '-1'))  # dBFS; limits peaks of tracks the loudness gain boosts
+RESUME_FADE_SECONDS = float(os.getenv('RESUME_FADE_SECONDS', '0.5'))  # fade-in when a track starts mid-way (0 = off)
+DEFAULT_VOLUME = int(os.getenv('DEFAULT_VOLUME', '100' if OPUS_PASSTHROUGH else '50')) / 100
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'audio_cache'))
+AUDIO_CACHE_BYTES = int(os.getenv('AUDIO_CACHE_MB', '1024')) * 1024 * 1024  # byte budget (0 disables)
+AUDIO_CACHE_MIN_PLAYS = int(os.getenv('AUDIO_CACHE_MIN_PLAYS', '3'))  # plays before a track is stored locally
+LOUDNESS_NORMALIZE = os.getenv('LOUDNESS_NORMALIZE', '1') == '1'
+LOUDNESS_TARGET = float(os.getenv('LOUDNESS_TARGET', '-14'))  # integrated LUFS that played tracks are gained toward
+LOUDNESS_MAX_BOOST = float(os.getenv('LOUDNESS_MAX_BOOST', '6'))  # dB; quiet tracks are never raised more than this
+LOUDNESS_SAMPLE_SECONDS = int(os.getenv('LOUDNESS_SAMPLE_SECONDS', '120'))  # audio read when analysing a stream (local files: all)
+LOUDNESS_FILE = os.getenv('LOUDNESS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'loudness.json'))
+LOUDNESS_CACHE_SIZE = int(os.getenv('LOUDNESS_CACHE_SIZE', '20000'))
+EXTRACTOR_BACKEND = os.getenv('EXTRACTOR_BACKEND', 'thread').lower()  # 'thread' or 'process'
+EXTRACTOR_PROCESSES = int(os.getenv('EXTRACTOR_PROCESSES', '2'))  # worker processes for the process backend
+# Extraction scheduler: global cap on concurrent extractions, slots kept for now-playing/!play,
+# and how many may wait before prefetch/background work is shed
+EXTRACT_CONCURRENCY = int(os.getenv('EXTRACT_CONCURRENCY', str(EXTRACTOR_PROCESSES if EXTRACTOR_BACKEND == 'process' else EXTRACTOR_THREADS)))
+EXTRACT_RESERVE = int(os.getenv('EXTRACT_RESERVE', '1'))
+EXTRACT_MAX_WAITING = int(os.getenv('EXTRACT_MAX_WAITING', '32'))
+# TTL used when a provider URL carries no expire= parameter
+PROVIDER_CACHE_TTL = {
+    None: int(os.getenv('RESOLVE_TTL_DIRECT', '3600')),
+    'Invidious': int(os.getenv('RESOLVE_TTL_INVIDIOUS', '1800')),
+    'Piped': int(os.getenv('RESOLVE_TTL_PIPED', '1800')),
+}
+
+
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))  # Prometheus text endpoint on localhost (0 = off)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+WATCHDOG_THRESHOLD = float(os.getenv('WATCHDOG_THRESHOLD', '0.25'))  # loop stall (s) that captures a stack (0 = off)
+WATCHDOG_INTERVAL = float(os.getenv('WATCHDOG_INTERVAL', '0.05'))  # heartbeat / lag sampling period
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+PROFILE_MAX_SECONDS = int(os.getenv('PROFILE_MAX_SECONDS', '60'))
+TRACE_FILE = os.getenv('TRACE_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'traces.jsonl'))  # '' = memory only
+TRACE_MAX_BYTES = int(os.getenv('TRACE_MAX_MB', '10')) * 1024 * 1024  # rotated to .1 past this size
+TRACE_FLUSH_INTERVAL = float(os.getenv('TRACE_FLUSH_INTERVAL', '2'))  # seconds finished traces are buffered
+
+
+class _Timer:
+    """Context manager recording elapsed time into a histogram with an outcome label."""
+
+    def __init__(self, metrics, name: str, labels: dict):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.outcome = 'ok'
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is asyncio.CancelledError:
+            self.outcome = 'cancelled'
+        elif exc_type is not None:
+            self.outcome = 'error'
+        self.metrics.observe(self.name, time.perf_counter() - self.start, outcome=self.outcome, **self.labels)
+        return False
+
+
+class Metrics:
+    """Thread-safe counters and latency histograms, rendered in Prometheus text format.
+
+    Recent samples are also kept per metric/stage so !status can show percentiles.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self.recent = {}  # (name, stage) -> deque of recent seconds
+        self.collectors = []  # callables yielding (name, type, labels, value) at scrape time
+
+    @staticmethod
+    def _key(name: str, labels: dict):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    hist[i] += 1
+            hist[-2] += seconds
+            hist[-1] += 1
+            recent_key = (name, labels.get('stage'))
+            if recent_key not in self.recent:
+                self.recent[recent_key] = deque(maxlen=256)
+            self.recent[recent_key].append(seconds)
+
+    def timer(self, name: str, **labels) -> _Timer:
+        return _Timer(self, name, labels)
+
+    def percentiles(self, name: str, stage=None, points=(50, 95)):
+        with self._lock:
+            samples = sorted(self.recent.get((name, stage), ()))
+        if not samples:
+            return None
+        return [samples[min(len(samples) - 1, int(len(samples) * p / 100))] for p in points]
+
+    @staticmethod
+    def _labels(labels) -> str:
+        if not labels:
+            return ''
+        body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels)
+        return '{' + body + '}'
+
+    def render(self) -> str:
+        """Render everything in the Prometheus text exposition format."""
+        lines = []
+        typed = set()
+        with self._lock:
+            counters = list(self.counters.items())
+            histograms = [(k, list(v)) for k, v in self.histograms.items()]
+        for (name, labels), value in sorted(counters):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{self._labels(labels)} {value}")
+        for (name, labels), hist in sorted(histograms):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            for bound, count in zip(LATENCY_BUCKETS, hist):
+                lines.append(f"{name}_bucket{self._labels(labels + (('le', str(bound)),))} {count}")
+            lines.append(f"{name}_bucket{self._labels(labels + (('le', '+Inf'),))} {hist[-1]}")
+            lines.append(f"{name}_sum{self._labels(labels)} {hist[-2]:.6f}")
+            lines.append(f"{name}_count{self._labels(labels)} {hist[-1]}")
+        for collect in self.collectors:
+            for name, kind, labels, value in collect():
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{self._labels(tuple(sorted(labels.items())))} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+_metrics_runner = None
+
+
+async def start_metrics_server():
+    """Serve /metrics on 127.0.0.1:METRICS_PORT."""
+    global _metrics_runner
+    if METRICS_PORT <= 0 or _metrics_runner is not None:
+        return
+
+    async def handle(request):
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, '127.0.0.1', METRICS_PORT).start()
+    except OSError as e:
+        print(f"[metrics] cannot listen on 127.0.0.1:{METRICS_PORT}: {e}")
+        await runner.cleanup()
+        return
+    _metrics_runner = runner
+    print(f"[metrics] serving http://127.0.0.1:{METRICS_PORT}/metrics")
+
+
+async def stop_metrics_server():
+    global _metrics_runner
+    if _metrics_runner is not None:
+        await _metrics_runner.cleanup()
+        _metrics_runner = None
+
+
+class LoopWatchdog:
+    """Measures event-loop lag and captures the loop thread's stack when it stalls.
+
+    A task on the loop stamps a heartbeat every WATCHDOG_INTERVAL and records
+    how late each wake-up was. A separate thread watches the heartbeat; once
+    it is older than the threshold, the loop is blocked right now, so the
+    loop thread's current stack is what is blocking it.
+    """
+
+    def __init__(self, threshold: float, interval: float):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = deque(maxlen=10)  # (wall time, seconds blocked, stack text)
+        self._beat = time.monotonic()
+        self._loop_thread = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    async def _heartbeat(self):
+        while True:
+            start = time.monotonic()
+            self._beat = start
+            await asyncio.sleep(self.interval)
+            metrics.observe('jalebi_loop_lag_seconds', max(0.0, time.monotonic() - start - self.interval))
+
+    def _watch(self):
+        captured = None  # (beat the stall started from, stack)
+        while not self._stop.wait(self.interval):
+            beat = self._beat
+            blocked = time.monotonic() - beat
+            if blocked >= self.threshold and (captured is None or captured[0] != beat):
+                frame = sys._current_frames().get(self._loop_thread)
+                stack = ''.join(traceback.format_stack(frame)) if frame is not None else '<no frame>'
+                captured = (beat, stack)
+            elif captured is not None and captured[0] != beat:
+                # Loop is running again: report how long the stall lasted
+                stalled_for = self._beat - captured[0] - self.interval
+                self.stalls.append((time.time(), stalled_for, captured[1]))
+                metrics.inc('jalebi_loop_stalls_total')
+                print(f"[watchdog] event loop blocked for {stalled_for:.2f}s at:\n{captured[1]}")
+                captured = None
+
+    def start(self):
+        if self.threshold <= 0 or self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._stop.set()
+
+    def last_stall(self) -> str:
+        """One line about the most recent stall (innermost frame), for !status."""
+        if not self.stalls:
+            return 'none'
+        at, seconds, stack = self.stalls[-1]
+        where = stack.strip().splitlines()[-2].strip() if stack.count('\n') > 1 else stack.strip()
+        return f"{len(self.stalls)} recent, last {seconds:.2f}s {int(time.time() - at)}s ago ({where[:90]})"
+
+
+loop_watchdog = LoopWatchdog(WATCHDOG_THRESHOLD, WATCHDOG_INTERVAL)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+
+def sample_profile(seconds: float, interval: float = 0.005) -> dict:
+    """Sample every thread's stack for seconds; returns collapsed stack -> sample count.
+
+    Keys are 'thread;outer;...;inner', the folded format read by flamegraph.pl
+    and speedscope.
+    """
+    me = threading.get_ident()
+    counts = {}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            key = ';'.join([names.get(ident, str(ident))] + stack[::-1])
+            counts[key] = counts.get(key, 0) + 1
+        time.sleep(interval)
+    return counts
+
+
+def write_profile(counts: dict) -> str:
+    """Write collapsed stacks to PROFILE_DIR and return the file path."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in sorted(counts.items(), key=lambda item: -item[1]):
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+_active_trace = contextvars.ContextVar('active_trace', default=None)
+_span_depth = contextvars.ContextVar('span_depth', default=0)
+
+
+class Trace:
+    """One play/play_next request: timed spans from the command to the first audio frame."""
+
+    __slots__ = ('id', 'kind', 'guild_id', 'detail', 'wall', 'origin', 'spans', 'outcome', 'total')
+
+    def __init__(self, kind: str, guild_id, detail: str = '', lead: float = 0.0):
+        self.id = secrets.token_hex(6)
+        self.kind = kind
+        self.guild_id = guild_id
+        self.detail = detail
+        self.wall = time.time() - lead  # lead: how long the command took to reach us
+        self.origin = time.perf_counter() - lead
+        self.spans = []  # (name, start offset, duration, depth, attrs)
+        self.outcome = None  # set once finished
+        self.total = None
+
+    @property
+    def finished(self) -> bool:
+        return self.outcome is not None
+
+    def add(self, name: str, start: float, duration: float, depth: int = 0, **attrs):
+        if not self.finished:
+            self.spans.append((name, start - self.origin, duration, depth, attrs))
+
+    def as_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'guild': self.guild_id,
+            'detail': self.detail,
+            'ts': round(self.wall, 3),
+            'outcome': self.outcome,
+            'total': None if self.total is None else round(self.total, 4),
+            'spans': [
+                {'name': name, 'start': round(start, 4), 'duration': round(duration, 4), 'depth': depth, **attrs}
+                for name, start, duration, depth, attrs in sorted(self.spans, key=lambda span: span[1])
+            ],
+        }
+
+    def render(self) -> str:
+        total = f"{self.total:.2f}s" if self.total is not None else 'in progress'
+        lines = [f"Trace {self.id} · {self.kind} · {total} · {self.outcome or 'running'}"]
+        if self.detail:
+            lines.append(self.detail[:100])
+        for name, start, duration, depth, attrs in sorted(self.spans, key=lambda span: span[1]):
+            extra = ' '.join(f"{k}={str(v)[:60]}" for k, v in attrs.items())
+            lines.append(f"{'+' + format(start, '.3f') + 's':>9}  {'  ' * depth + name:<34} {duration:7.3f}s  {extra}".rstrip())
+        return '\n'.join(lines)
+
+
+@contextlib.contextmanager
+def trace_span(name: str, **attrs):
+    """Time the block as a span of the current task's trace (no-op without one).
+
+    Yields the span's attrs so the block can record an outcome or details.
+    """
+    trace = _active_trace.get()
+    if trace is None or trace.finished:
+        yield attrs
+        return
+    depth = _span_depth.get()
+    token = _span_depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except asyncio.CancelledError:
+        attrs.setdefault('outcome', 'cancelled')
+        raise
+    except Exception as e:
+        attrs.setdefault('outcome', 'error')
+        attrs.setdefault('error', str(e)[:120])
+        raise
+    finally:
+        _span_depth.reset(token)
+        trace.add(name, start, time.perf_counter() - start, depth, **attrs)
+
+
+def trace_event(name: str, **attrs):
+    """Record a zero-length span (something that happened) on the current trace."""
+    trace = _active_trace.get()
+    if trace is not None:
+        trace.add(name, time.perf_counter(), 0.0, _span_depth.get(), **attrs)
+
+
+class TraceLog:
+    """Keeps each guild's latest trace for !trace and appends finished ones to a JSONL file.
+
+    Finished traces are buffered and written by trace_loop() off the event
+    loop, so recording a trace never waits on disk.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path or None
+        self.max_bytes = max_bytes
+        self.latest = {}  # guild_id -> Trace
+        self.recent = deque(maxlen=256)
+        self.buffer = []
+        self.loop = None
+        self._write_lock = threading.Lock()
+
+    def start(self, kind: str, guild_id, detail: str = '', lead: float = 0.0) -> Trace:
+        """Begin a trace and make it current for this task (and tasks it creates)."""
+        self.loop = asyncio.get_running_loop()
+        trace = Trace(kind, guild_id, detail, lead)
+        _active_trace.set(trace)
+        self.latest[guild_id] = trace
+        self.recent.append(trace)
+        return trace
+
+    def finish(self, trace, outcome: str = 'ok', at: float | None = None, **attrs):
+        if trace is None or trace.finished:
+            return
+        at = at or time.perf_counter()
+        trace.add(outcome, at, 0.0, 0, **attrs)
+        trace.total = at - trace.origin
+        trace.outcome = outcome
+        if self.path:
+            self.buffer.append(json.dumps(trace.as_dict()))
+
+    def first_frame(self, trace, at: float):
+        """Called from the voice thread when the first frame of the traced track is read."""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.finish, trace, 'first_frame', at)
+
+    def find(self, trace_id: str):
+        return next((trace for trace in reversed(self.recent) if trace.id == trace_id), None)
+
+    def _write(self, lines: list):
+        with self._write_lock:
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, f"{self.path}.1")
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+            except OSError as e:
+                print(f"[trace] write failed: {e}")
+
+    async def flush(self):
+        if not self.buffer:
+            return
+        lines, self.buffer = self.buffer, []
+        await asyncio.get_running_loop().run_in_executor(None, self._write, lines)
+
+
+traces = TraceLog(TRACE_FILE, TRACE_MAX_BYTES)
+
+
+async def trace_loop():
+    while True:
+        await asyncio.sleep(TRACE_FLUSH_INTERVAL)
+        await traces.flush()
+
+
+# ytdl_format_options overrides per pooled option set
+EXTRACTOR_VARIANTS = {
+    'primary': {},
+    'default_client': {'extractor_args': {'youtube': {'player_client': ['default']}}},
+    'download': {'extractor_args': {'youtube': {'player_client': ['default']}}},
+}
+if AUDIO_CACHE_BYTES > 0:
+    # Last-resort downloads land in the managed audio cache instead of the working directory
+    EXTRACTOR_VARIANTS['download']['outtmpl'] = os.path.join(AUDIO_CACHE_DIR, 'partial', '%(id)s.%(ext)s')
+
+
+EXTRACT_STAGE_NAMES = {'primary': 'primary', 'default_client': 'fallback_client', 'download': 'force_download'}
+
+
+def _build_ytdl(variant: str = 'primary'):
+    """Build a YoutubeDL instance for one of the EXTRACTOR_VARIANTS option sets."""
+    opts = ytdl_format_options.copy()
+    opts.update(EXTRACTOR_VARIANTS[variant])
+    return load_yt_dlp().YoutubeDL(opts)
+
+
+PRIORITIES = ('now', 'play', 'prefetch', 'background')  # highest first
+BACKGROUND_PRIORITIES = ('prefetch', 'background')
+
+# (priority, guild_id) of the extraction work the current task is doing
+_extraction_class = contextvars.ContextVar('extraction_class', default=('play', None))
+
+
+def background_task_context(priority: str, guild_id=None):
+    """Start a background task: tag its extraction work and detach it from the trace of the request that spawned it.
+
+    Both context vars are task-local, so call this first thing in the task.
+    """
+    _extraction_class.set((priority, guild_id))
+    _active_trace.set(None)
+
+
+class ExtractionShed(Exception):
+    """Raised when the scheduler turns prefetch/background extraction away under load."""
+
+
+class ExtractionScheduler:
+    """Admits extraction work by priority class, round-robin across guilds within a class.
+
+    At most `limit` extractions run at once and prefetch/background work
+    never takes the last `reserve` slots. Once `max_waiting` requests are
+    queued, new prefetch/background work is shed, and higher-priority work
+    evicts the newest waiter of the lowest waiting class.
+    """
+
+    def __init__(self, limit: int, reserve: int, max_waiting: int):
+        self.limit = max(1, limit)
+        self.reserve = min(reserve, self.limit - 1)
+        self.max_waiting = max_waiting
+        self.running = 0
+        self.waiting = {p: OrderedDict() for p in PRIORITIES}  # priority -> guild -> deque of futures
+        self.shed = {p: 0 for p in PRIORITIES}
+
+    def _capacity(self, priority: str) -> int:
+        return self.limit - (self.reserve if priority in BACKGROUND_PRIORITIES else 0)
+
+    def waiting_count(self, priority: str | None = None) -> int:
+        classes = [priority] if priority else PRIORITIES
+        return sum(len(waiters) for p in classes for waiters in self.waiting[p].values())
+
+    def _shed_lowest(self, below: str) -> bool:
+        """Fail the newest waiter of the lowest class ranked below `below`."""
+        for priority in reversed(PRIORITIES[PRIORITIES.index(below) + 1:]):
+            for guild, waiters in reversed(self.waiting[priority].items()):
+                fut = waiters.pop()
+                if not waiters:
+                    del self.waiting[priority][guild]
+                if fut.done():
+                    return True  # already cancelled; its slot in the queue is freed either way
+                self._count_shed(priority)
+                fut.set_exception(ExtractionShed(f"extractor busy, {priority} work shed"))
+                return True
+        return False
+
+    def promote(self, guild, source: str, target: str):
+        """Move a guild's waiting work up a class, e.g. a prefetch that play_next now needs."""
+        waiters = self.waiting[source].pop(guild, None)
+        if waiters:
+            self.waiting[target].setdefault(guild, deque()).extend(waiters)
+            self._dispatch()
+
+    def _count_shed(self, priority: str):
+        self.shed[priority] += 1
+        metrics.inc('jalebi_extract_shed_total', priority=priority)
+
+    def _dispatch(self):
+        for priority in PRIORITIES:
+            guilds = self.waiting[priority]
+            while guilds and self.running < self._capacity(priority):
+                guild, waiters = next(iter(guilds.items()))
+                fut = waiters.popleft()
+                del guilds[guild]
+                if waiters:
+                    guilds[guild] = waiters  # back of the rotation
+                if not fut.done():
+                    self.running += 1
+                    fut.set_result(None)
+            if guilds:
+                return  # never let a lower class jump ahead of one still waiting
+
+    async def acquire(self, priority: str, guild):
+        higher_waiting = any(self.waiting[p] for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+        if self.running < self._capacity(priority) and not higher_waiting:
+            self.running += 1
+            return
+        if self.waiting_count() >= self.max_waiting:
+            if priority in BACKGROUND_PRIORITIES or not self._shed_lowest(priority):
+                self._count_shed(priority)
+                raise ExtractionShed(f"extractor busy, {priority} work shed")
+        fut = asyncio.get_running_loop().create_future()
+        self.waiting[priority].setdefault(guild, deque()).append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()  # granted just as we were cancelled
+                raise
+            for waiting in self.waiting.values():  # it may have been promoted to another class
+                waiters = waiting.get(guild)
+                if waiters and fut in waiters:
+                    waiters.remove(fut)
+                    if not waiters:
+                        del waiting[guild]
+                    break
+            raise
+
+    def release(self):
+        self.running -= 1
+        self._dispatch()
+
+    def _release_from_thread(self, loop):
+        try:
+            loop.call_soon_threadsafe(self.release)
+        except RuntimeError:
+            pass  # loop already closed on shutdown
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Hold one extraction slot for the current task's priority class and guild.
+
+        Yields hold(future): pass it the executor future doing the work, and
+        the slot is released when that future finishes instead of when the
+        block exits, so a cancelled caller doesn't free a slot whose yt-dlp
+        call is still running on its thread.
+        """
+        priority, guild = _extraction_class.get()
+        started = time.perf_counter()
+        with trace_span('extract_wait', priority=priority):
+            await self.acquire(priority, guild)
+        metrics.observe('jalebi_extract_wait_seconds', time.perf_counter() - started, priority=priority)
+        held = []
+        try:
+            yield held.append
+        finally:
+            running = next((f for f in held if not f.done()), None)
+            if running is None:
+                self.release()
+            else:
+                loop = asyncio.get_running_loop()
+                running.add_done_callback(lambda _: self._release_from_thread(loop))
+
+    def stats(self) -> str:
+        waiting = ', '.join(f"{p} {self.waiting_count(p)}" for p in PRIORITIES)
+        return f"{self.running}/{self.limit} running, waiting: {waiting}, {sum(self.shed.values())} shed"
+
+
+extraction_scheduler = ExtractionScheduler(EXTRACT_CONCURRENCY, EXTRACT_RESERVE, EXTRACT_MAX_WAITING)
+
+
+class ExtractorPool:
+    """Warm YoutubeDL instances per option set, run on a dedicated thread pool.
+
+    Instances are reused across calls so construction cost and yt-dlp's
+    in-memory player-JS/signature caches stay off the request path. Each
+    instance is used by one thread at a time.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ytdl')
+        self._idle = {variant: [] for variant in EXTRACTOR_VARIANTS}
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.queued = 0
+        self.active = 0
+
+    def _acquire(self, variant: str):
+        with self._lock:
+            if self._idle[variant]:
+                return self._idle[variant].pop()
+        return _build_ytdl(variant)
+
+    def _release(self, variant: str, ydl, generation: int):
+        with self._lock:
+            if generation == self.generation:
+                self._idle[variant].append(ydl)
+
+    def _mark_started(self, state: dict):
+        with self._lock:
+            if not state['started']:
+                state['started'] = True
+                self.queued -= 1
+
+    def _call(self, variant, fn, state: dict):
+        self._mark_started(state)
+        generation = self.generation
+        with self._lock:
+            self.active += 1
+        try:
+            if variant is None:
+                return fn()
+            ydl = self._acquire(variant)
+            try:
+                return fn(ydl)
+            finally:
+                self._release(variant, ydl, generation)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    async def run(self, variant, fn):
+        """Run fn(ydl) on a pooled instance of the given variant without blocking the loop.
+
+        With variant=None, fn() is called without an instance (plain executor work).
+        """
+        async with extraction_scheduler.slot() as hold:
+            state = {'started': False}
+            with self._lock:
+                self.queued += 1
+            try:
+                future = self.executor.submit(self._call, variant, fn, state)
+                hold(future)
+                return await asyncio.wrap_future(future)
+            finally:
+                self._mark_started(state)  # cancelled before a thread picked it up
+
+    def _warm_one(self, variant: str):
+        generation = self.generation
+        self._release(variant, _build_ytdl(variant), generation)
+
+    def warm(self):
+        """Pre-build one instance per option set in the background."""
+        for variant in EXTRACTOR_VARIANTS:
+            self.executor.submit(self._warm_one, variant)
+
+    def reset(self):
+        """Drop pooled instances, e.g. after ytdl_format_options changed."""
+        with self._lock:
+            self.generation += 1
+            for idle in self._idle.values():
+                idle.clear()
+
+    def stats(self) -> str:
+        idle = sum(len(v) for v in self._idle.values())
+        return f"{self.active}/{self.max_workers} busy, {self.queued} queued, {idle} warm"
+
+
+extractor_pool = ExtractorPool(EXTRACTOR_THREADS)
+
+
+class ProcessExtractorPool:
+    """Runs extract_info_safe() work in long-lived worker processes (extract_worker.py).
+
+    Each worker keeps its own warm YoutubeDL per option set and returns only
+    the trimmed fields we use. A crashed worker breaks the executor; it is
+    then rebuilt and the call retried once.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.executor = None
+        self.restarts = 0
+        self.pending = 0
+
+    def _ensure(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=extract_worker.init_worker,
+                initargs=(ytdl_format_options.copy(), EXTRACTOR_VARIANTS),
+            )
+        return self.executor
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _worker_main():
+        """Start workers with extract_worker, not bot.py, as their __main__.
+
+        The spawn start method re-runs the parent's __main__ in each child;
+        for bot.py that means discord.py and the other heavy imports, the
+        caches' load() (which prunes partial/), the SQLite stores and a
+        second JalebiBot. ProcessPoolExecutor launches its workers inside
+        submit(), so every submit goes through here.
+        """
+        main = sys.modules['__main__']
+        sys.modules['__main__'] = extract_worker
+        try:
+            yield
+        finally:
+            sys.modules['__main__'] = main
+
+    def _discard(self, executor):
+        if self.executor is executor:
+            self.executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
 
+    async def extract(self, variant: str, url: str, download: bool, process: bool):
+        async with extraction_scheduler.slot() as hold:
+            return await self._extract(variant, url, download, process, hold)
 
-def _build_ytdl():
-    """Rebuild YoutubeDL instance (used for fallback attempts when options change)."""
-    return yt_dlp.YoutubeDL(ytdl_format_options)
+    async def _extract(self, variant: str, url: str, download: bool, process: bool, hold):
+        self.pending += 1
+        try:
+            for attempt in range(2):
+                executor = self._ensure()
+                try:
+                    with self._worker_main():
+                        future = executor.submit(
+                            extract_worker.extract, variant, url, download, process, MAX_PLAYLIST_ITEMS)
+                    hold(future)
+                    return await asyncio.wrap_future(future)
+                except BrokenProcessPool as e:
+                    print(f"[extract] worker process died, restarting pool: {e}")
+                    self.restarts += 1
+                    self._discard(executor)
+                    if attempt:
+                        raise
+        finally:
+            self.pending -= 1
+
+    def warm(self):
+        executor = self._ensure()
+        with self._worker_main():
+            for _ in range(self.workers):
+                for variant in EXTRACTOR_VARIANTS:
+                    executor.submit(extract_worker.warm, variant)
+
+    def reset(self):
+        """Restart the workers so they pick up changed ytdl_format_options."""
+        if self.executor is not None:
+            self._discard(self.executor)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def stats(self) -> str:
+        state = 'up' if self.executor is not None else 'idle'
+        return f"{self.workers} processes ({state}), {self.pending} in flight, {self.restarts} restarts"
+
+
+process_extractor = ProcessExtractorPool(EXTRACTOR_PROCESSES) if EXTRACTOR_BACKEND == 'process' else None
 
 
 async def extract_info_safe(url: str, *, download: bool = False, process: bool = True):
@@ -147,34 +1148,53 @@ async def extract_info_safe(url: str, *, download: bool = False, process: bool =
     3. Retry forcing default player client
     4. As last resort: download the file (slower) and use local filename
     """
-    loop = asyncio.get_event_loop()
-
-    async def _run(extractor_opts_override=None, force_download=False):
-        opts = ytdl_format_options.copy()
-        if extractor_opts_override:
-            opts['extractor_args'] = extractor_opts_override
-        ytdl_local = yt_dlp.YoutubeDL(opts)
-        return await loop.run_in_executor(
-            None,
-            lambda: ytdl_local.extract_info(url, download=force_download or download, process=process)
-        )
+    async def _run(variant='primary', force_download=False):
+        with metrics.timer('jalebi_stage_seconds', stage=EXTRACT_STAGE_NAMES[variant]), \
+                trace_span(f"yt-dlp {EXTRACT_STAGE_NAMES[variant]}"):
+            if process_extractor is not None:
+                return await process_extractor.extract(variant, url, force_download or download, process)
+            return await extractor_pool.run(
+                variant,
+                lambda ydl: ydl.extract_info(url, download=force_download or download, process=process)
+            )
 
     try:
         data = await _run()
+    except ExtractionShed:
+        raise
     except Exception as e1:
         print(f"[extract] primary failed: {e1}")
         try:
-            data = await _run({'youtube': {'player_client': ['default']}})
+            data = await _run('default_client')
+        except ExtractionShed:
+            raise
         except Exception as e2:
             print(f"[extract] fallback client failed: {e2}")
             try:
-                data = await _run({'youtube': {'player_client': ['default']}}, force_download=True)
+                data = await _run('download', force_download=True)
             except Exception as final_err:
                 print(f"[extract] force download failed: {final_err}")
                 raise final_err
+            data = audio_cache.adopt_download(data)
     return data
 
 
+async def open_playlist(url: str):
+    """Fetch a playlist shell whose entries stay lazy (process=False).
+
+    The entries generator keeps using the extractor that created it while
+    later pages are pulled, so it gets its own instance instead of a pooled one.
+    """
+    def _open(variant):
+        return _build_ytdl(variant).extract_info(url, download=False, process=False)
+
+    try:
+        return await extractor_pool.run(None, lambda: _open('primary'))
+    except Exception as e:
+        print(f"[playlist] primary failed: {e}")
+        return await extractor_pool.run(None, lambda: _open('default_client'))
+
+
 def select_playable_url(data: dict):
     """Return a playable audio URL (or local filename) from yt-dlp data."""
     if not data:
@@ -187,8 +1207,8 @@ def select_playable_url(data: dict):
     formats = data.get('formats') or []
     audio = [f for f in formats if f.get('acodec') and f.get('acodec') != 'none' and f.get('url')]
     if audio:
-        # Prefer highest abr
-        audio.sort(key=lambda f: f.get('abr') or 0)
+        # Prefer highest abr (Opus first when passthrough is on)
+        audio.sort(key=lambda f: (OPUS_PASSTHROUGH and f.get('acodec') == 'opus', f.get('abr') or 0))
         return audio[-1]['url']
     # If downloaded
     if data.get('_filename'):
@@ -196,9 +1216,10 @@ def select_playable_url(data: dict):
     return None
 
 
-async def enqueue_playlist_fast(entries, ctx, queue):
+async def enqueue_playlist_fast(entries, queue, channel_id, requester_id=None):
     """Enqueue playlist entries quickly without full metadata extraction.
-    Only basic fields are stored. Full extraction happens when each track plays.
+    Only basic fields are stored. Full extraction happens when each track plays
+    (or ahead of playback via schedule_enrichment() in full playlist mode).
     """
     added = 0
     # Support both list-like and generator/iterable entries
@@ -217,11 +1238,42 @@ async def enqueue_playlist_fast(entries, ctx, queue):
             base_url = entry.get('webpage_url') or entry.get('url')
         if not base_url:
             continue
-        queue.add({'url': base_url, 'title': entry.get('title') or 'Unknown', 'ctx': ctx})
+        queue.add(Track(base_url, entry.get('title') or 'Unknown', channel_id, requester_id))
         added += 1
     return added
 
 
+class PlaylistFeed:
+    """Lazy cursor over a playlist's entries; pages are pulled into the queue on demand."""
+
+    def __init__(self, entries, title, channel_id, requester_id=None):
+        self.entries = iter(entries)
+        self.title = title
+        self.channel_id = channel_id
+        self.requester_id = requester_id
+        self.added = 0
+        self.target = MAX_PLAYLIST_ITEMS
+        self.exhausted = False
+        self.announced = False
+
+    async def pull(self, queue, count: int) -> int:
+        """Enqueue up to count more entries; returns how many were added."""
+        if PLAYLIST_MAX_TRACKS:
+            count = min(count, PLAYLIST_MAX_TRACKS - self.added)
+        if count <= 0:
+            self.exhausted = True
+            return 0
+        # Iterating the lazy entries may fetch the next continuation page, so do it off the loop
+        page = await extractor_pool.run(None, lambda: list(itertools.islice(self.entries, count)))
+        if len(page) < count:
+            self.exhausted = True
+        added = await enqueue_playlist_fast(page, queue, self.channel_id, self.requester_id)
+        self.added += added
+        if added and not FAST_PLAYLIST_MODE:
+            schedule_enrichment(queue, itertools.islice(queue.queue, len(queue) - added, None), self.channel_id)
+        return added
+
+
 def extract_video_id(url: str) -> str | None:
     """Extract YouTube video ID from multiple URL patterns."""
     patterns = [
@@ -238,15 +1290,183 @@ def extract_video_id(url: str) -> str | None:
     return None
 
 
-def invidious_api_video(video_id: str) -> dict | None:
-    """Fetch video information from Invidious as a fallback."""
+_http_session = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the shared keep-alive session used for fallback API calls."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_SIZE,
+            limit_per_host=HTTP_POOL_PER_HOST,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        _http_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT, sock_connect=HTTP_CONNECT_TIMEOUT),
+            headers={'User-Agent': USER_AGENT, 'Accept': 'application/json'},
+        )
+    return _http_session
+
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
+
+async def fetch_json(url: str) -> dict | None:
+    """GET url on the shared session; returns parsed JSON on HTTP 200, else None.
+
+    Network errors and timeouts propagate so callers can log per host.
+    """
+    async with get_http_session().get(url) as resp:
+        if resp.status != 200:
+            return None
+        return await resp.json(content_type=None)
+
+
+def write_json_atomic(path: str, obj):
+    """Write obj as JSON to a temp file, then rename it over path so readers never see half a file."""
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+class ProviderHealth:
+    """Scoreboard of fallback hosts: EWMA success rate and latency plus a circuit breaker.
+
+    A host that fails HEALTH_FAILURES times in a row is skipped until its
+    open period ends; the background prober (or the next request) then
+    retries it. order() puts the fastest healthy host first.
+    """
+
+    def __init__(self, path: str | None, alpha: float, failure_threshold: int, open_seconds: int):
+        self.path = path or None
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.hosts = {}  # host -> {'success', 'latency', 'failures', 'open_until'}
+        self.dirty = False
+        self._write_lock = threading.Lock()
+
+    def _entry(self, host: str) -> dict:
+        entry = self.hosts.get(host)
+        if entry is None:
+            # Optimistic start so new hosts get tried
+            entry = self.hosts[host] = {'success': 1.0, 'latency': 1.0, 'failures': 0, 'open_until': 0.0}
+        return entry
+
+    def record(self, host: str, ok: bool, seconds: float):
+        entry = self._entry(host)
+        entry['success'] += self.alpha * ((1.0 if ok else 0.0) - entry['success'])
+        entry['latency'] += self.alpha * (seconds - entry['latency'])
+        if ok:
+            if entry['failures'] >= self.failure_threshold:
+                print(f"[health] {host} recovered")
+            entry['failures'] = 0
+            entry['open_until'] = 0.0
+        else:
+            entry['failures'] += 1
+            over = entry['failures'] - self.failure_threshold
+            if over >= 0:
+                entry['open_until'] = time.time() + min(self.open_seconds * 2 ** over, 1800)
+                if over == 0:
+                    print(f"[health] circuit opened for {host}")
+        self.dirty = True
+
+    def is_open(self, host: str) -> bool:
+        entry = self.hosts.get(host)
+        return entry is not None and entry['open_until'] > time.time()
+
+    def score(self, host: str) -> float:
+        """Expected seconds per successful request (lower is better)."""
+        entry = self._entry(host)
+        return entry['latency'] / max(entry['success'], 0.05)
+
+    def order(self, hosts: list) -> list:
+        """Hosts with closed circuits, fastest first; all hosts if every circuit is open."""
+        ranked = sorted(hosts, key=self.score)
+        closed = [h for h in ranked if not self.is_open(h)]
+        return closed or ranked
+
+    def probe_due(self, hosts: list) -> list:
+        """Hosts whose circuit tripped and whose open period has ended (half-open)."""
+        return [
+            h for h in hosts
+            if self._entry(h)['failures'] >= self.failure_threshold and not self.is_open(h)
+        ]
+
+    def load(self):
+        if not self.path or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except Exception as e:
+            print(f"[health] load failed: {e}")
+            return
+        for host, entry in stored.items():
+            if isinstance(entry, dict) and {'success', 'latency', 'failures', 'open_until'} <= entry.keys():
+                self.hosts[host] = entry
+        print(f"[health] restored {len(self.hosts)} provider hosts")
+
+    def _write(self, snapshot):
+        with self._write_lock:
+            try:
+                write_json_atomic(self.path, snapshot)
+            except Exception as e:
+                print(f"[health] save failed: {e}")
+
+    def save_soon(self):
+        """Persist the scoreboard off the event loop if it changed."""
+        if not self.path or not self.dirty:
+            return
+        self.dirty = False
+        snapshot = {host: dict(entry) for host, entry in self.hosts.items()}
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(snapshot)
+            return
+        loop.run_in_executor(None, self._write, snapshot)
+
+    def stats(self, hosts: list) -> str:
+        parts = []
+        for host in sorted(hosts, key=lambda h: (self.is_open(h), self.score(h))):
+            entry = self._entry(host)
+            name = urllib.parse.urlparse(host).hostname or host
+            if self.is_open(host):
+                parts.append(f"{name} open {int(entry['open_until'] - time.time())}s")
+            else:
+                parts.append(f"{name} {entry['success']:.0%} {entry['latency']:.1f}s")
+        return ', '.join(parts)
+
+
+provider_health = ProviderHealth(HEALTH_FILE, HEALTH_EWMA_ALPHA, HEALTH_FAILURES, HEALTH_OPEN_SECONDS)
+provider_health.load()
+
+
+async def fetch_provider(stage: str, host: str, path: str) -> dict | None:
+    """fetch_json() against one fallback host, timed per stage and host and scored in provider_health."""
+    start = time.perf_counter()
     try:
-        resp = requests.get(f"{INVIDIOUS_HOST}/api/v1/videos/{video_id}", timeout=10)
-        if resp.status_code == 200:
-            return resp.json()
+        with metrics.timer('jalebi_stage_seconds', stage=stage, host=host) as timer, \
+                trace_span(f"{stage} {urllib.parse.urlparse(host).hostname or host}") as span:
+            data = await fetch_json(f"{host}{path}")
+            if data is None:
+                timer.outcome = span['outcome'] = 'miss'
+    except asyncio.CancelledError:
+        raise  # a lost race says nothing about the host
     except Exception:
-        return None
-    return None
+        provider_health.record(host, False, time.perf_counter() - start)
+        raise
+    provider_health.record(host, data is not None, time.perf_counter() - start)
+    return data
 
 
 def pick_invidious_audio(data: dict) -> str | None:
@@ -260,32 +1480,76 @@ def pick_invidious_audio(data: dict) -> str | None:
         streams = data.get('formatStreams') or []
         audio = [f for f in streams if f.get('type', '').startswith('audio/') and f.get('url')]
     if audio:
-        # Prefer highest bitrate
-        audio.sort(key=lambda f: f.get('bitrate') or 0)
+        # Prefer highest bitrate (Opus first when passthrough is on)
+        audio.sort(key=lambda f: (OPUS_PASSTHROUGH and 'opus' in f.get('type', ''), int(f.get('bitrate') or 0)))
         return audio[-1]['url']
     return None
 
-def invidious_api_video(video_id: str) -> dict | None:  # replace previous definition with rotating hosts
-    hosts = [INVIDIOUS_HOST] + [h for h in _INVIDIOUS_DEFAULTS if h.rstrip('/') != INVIDIOUS_HOST]
-    for host in hosts:
+def invidious_hosts() -> list:
+    """Invidious hosts in try order: healthiest first (configured host wins ties), open circuits skipped."""
+    return provider_health.order([INVIDIOUS_HOST] + [h for h in _INVIDIOUS_DEFAULTS if h.rstrip('/') != INVIDIOUS_HOST])
+
+
+def fallback_hosts() -> list:
+    """Every configured Invidious and Piped host, unordered."""
+    return [INVIDIOUS_HOST] + [h for h in _INVIDIOUS_DEFAULTS if h.rstrip('/') != INVIDIOUS_HOST] + PIPED_HOSTS
+
+
+def piped_hosts() -> list:
+    """Piped hosts in try order, healthiest first."""
+    return provider_health.order(PIPED_HOSTS)
+
+
+async def probe_providers(hosts: list | None = None) -> dict:
+    """Probe fallback hosts with a known video; defaults to the half-open ones.
+
+    Returns host -> ok. Results are recorded through fetch_provider().
+    """
+    hosts = provider_health.probe_due(fallback_hosts()) if hosts is None else hosts
+
+    async def probe(host):
+        path = f"/streams/{PROBE_VIDEO_ID}" if host in PIPED_HOSTS else f"/api/v1/videos/{PROBE_VIDEO_ID}"
         try:
-            resp = requests.get(f"{host}/api/v1/videos/{video_id}", timeout=8)
-            if resp.status_code == 200:
+            return await fetch_provider('probe', host, path) is not None
+        except Exception:
+            return False
+
+    results = await asyncio.gather(*(probe(h) for h in hosts))
+    return dict(zip(hosts, results))
+
+
+async def provider_health_loop():
+    """Re-probe tripped hosts and persist the scoreboard every HEALTH_PROBE_INTERVAL."""
+    while True:
+        await asyncio.sleep(HEALTH_PROBE_INTERVAL)
+        try:
+            await probe_providers()
+        except Exception as e:
+            print(f"[health] probe failed: {e!r}")
+        provider_health.save_soon()
+
+
+async def invidious_api_video(video_id: str) -> dict | None:
+    """Fetch video information from Invidious, rotating through known hosts."""
+    for host in invidious_hosts():
+        try:
+            data = await fetch_provider('invidious', host, f"/api/v1/videos/{video_id}")
+            if data is not None:
                 if host != INVIDIOUS_HOST:
                     print(f"[invidious] switched host: {host}")
-                return resp.json()
+                return data
         except Exception as e:
-            print(f"[invidious] host {host} failed: {e}")
+            print(f"[invidious] host {host} failed: {e!r}")
     return None
 
-def piped_api_video(video_id: str) -> dict | None:
-    for host in PIPED_HOSTS:
+async def piped_api_video(video_id: str) -> dict | None:
+    for host in piped_hosts():
         try:
-            resp = requests.get(f"{host}/streams/{video_id}", timeout=8)
-            if resp.status_code == 200:
-                return resp.json()
+            data = await fetch_provider('piped', host, f"/streams/{video_id}")
+            if data is not None:
+                return data
         except Exception as e:
-            print(f"[piped] host {host} failed: {e}")
+            print(f"[piped] host {host} failed: {e!r}")
     return None
 
 def pick_piped_audio(data: dict) -> str | None:
@@ -295,95 +1559,1302 @@ def pick_piped_audio(data: dict) -> str | None:
     usable = [s for s in streams if s.get('url')]
     if not usable:
         return None
-    usable.sort(key=lambda s: s.get('bitrate') or 0)
+    usable.sort(key=lambda s: (OPUS_PASSTHROUGH and _piped_codec(s) == 'opus', s.get('bitrate') or 0))
     return usable[-1]['url']
 
-async def resolve_audio(url: str):
+
+def _piped_codec(stream: dict) -> str | None:
+    codec = (stream.get('codec') or '').lower()
+    if 'opus' in codec or 'opus' in (stream.get('mimeType') or ''):
+        return 'opus'
+    return codec or None
+
+
+def stream_codec(playable: str, data: dict | None) -> str | None:
+    """Best-effort audio codec of the chosen stream ('opus', 'mp4a.40.2', ...)."""
+    if not data:
+        return None
+    if data.get('acodec') and data.get('url') == playable:
+        return data['acodec']
+    for f in data.get('formats') or []:
+        if f.get('url') == playable:
+            return f.get('acodec')
+    if '://' not in playable and playable.endswith(('.opus', '.ogg')):
+        return 'opus'
+    return None
+
+
+def trim_resolved(playable: str, data: dict) -> dict:
+    """Keep only the fields of a resolution that play_next needs (the ones ResolveCache stores)."""
+    return {
+        'url': playable,
+        'title': data.get('title') or 'Unknown',
+        'duration': data.get('duration'),
+        'acodec': stream_codec(playable, data),
+    }
+
+def stream_url_expiry(url: str) -> int | None:
+    """Return the unix expiry embedded in a googlevideo-style URL, if any."""
+    try:
+        parts = urllib.parse.urlsplit(url)
+    except ValueError:
+        return None
+    expire = urllib.parse.parse_qs(parts.query).get('expire')
+    if expire and expire[0].isdigit():
+        return int(expire[0])
+    m = re.search(r"/expire/(\d+)", parts.path)
+    if m:
+        return int(m.group(1))
+    return None
+
+
+def resolution_expires_at(playable: str, duration, used) -> float:
+    """Return the time after which a resolved URL should no longer be started."""
+    expire = stream_url_expiry(playable)
+    if expire is None:
+        return time.time() + PROVIDER_CACHE_TTL.get(used, PROVIDER_CACHE_TTL[None])
+    # Keep enough validity left to stream the whole track (ffmpeg may reconnect mid-track)
+    try:
+        duration = float(duration or 0)
+    except (TypeError, ValueError):
+        duration = 0
+    return expire - RESOLVE_CACHE_MARGIN - duration
+
+
+class SharedResolveStore:
+    """Resolved-stream entries in a SQLite file (WAL mode) shared by all shard processes.
+
+    Readers never block the writer, so a track resolved by one shard is
+    visible to every other shard as soon as its write commits.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS resolved '
+            '(video_id TEXT PRIMARY KEY, entry TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+
+    def get(self, video_id: str) -> dict | None:
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    'SELECT entry FROM resolved WHERE video_id = ? AND expires_at > ?',
+                    (video_id, time.time()),
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"[store] read failed: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def put(self, video_id: str, entry: dict):
+        try:
+            with self._lock:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO resolved (video_id, entry, expires_at) VALUES (?, ?, ?)',
+                    (video_id, json.dumps(entry), entry['expires_at']),
+                )
+        except sqlite3.Error as e:
+            print(f"[store] write failed: {e}")
+
+    def delete(self, video_id: str):
+        try:
+            with self._lock:
+                self._db.execute('DELETE FROM resolved WHERE video_id = ?', (video_id,))
+        except sqlite3.Error as e:
+            print(f"[store] delete failed: {e}")
+
+    def prune(self) -> int:
+        """Drop expired rows; returns how many were removed."""
+        try:
+            with self._lock:
+                return self._db.execute('DELETE FROM resolved WHERE expires_at <= ?', (time.time(),)).rowcount
+        except sqlite3.Error as e:
+            print(f"[store] prune failed: {e}")
+            return 0
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM resolved').fetchone()[0]
+
+
+class ResolveCache:
+    """LRU cache of resolved streams keyed by YouTube video ID.
+
+    Entries hold the playable URL, title, duration and provider and expire
+    from the URL's own expire= parameter (or a per-provider TTL). With a
+    SharedResolveStore, misses fall through to it and new entries are
+    written through, so shard processes share resolutions.
+    """
+
+    def __init__(self, max_entries: int, path: str | None = None, store: SharedResolveStore | None = None):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.store = store
+        self.path = None if store else (path or None)  # the store already persists
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self._write_lock = threading.Lock()
+
+    def _is_live(self, entry: dict) -> bool:
+        if entry['expires_at'] <= time.time():
+            return False
+        playable = entry['url']
+        if '://' not in playable and not os.path.isfile(playable):
+            return False  # downloaded file was removed
+        return True
+
+    async def get(self, video_id: str) -> dict | None:
+        """Return a live entry for video_id (counting hit/miss) or None.
+
+        A miss falls through to the shared store on the default executor, so
+        a busy SQLite file never stalls the event loop.
+        """
+        entry = self.entries.get(video_id)
+        if entry is None and self.store is not None and self.max_entries > 0:
+            entry = await asyncio.get_running_loop().run_in_executor(None, self.store.get, video_id)
+            if entry is not None and self._is_live(entry):
+                self.entries[video_id] = entry
+                self.shared_hits += 1
+        if entry is None or not self._is_live(entry):
+            if entry is not None:
+                self.entries.pop(video_id, None)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(video_id)
+        self.hits += 1
+        return entry
+
+    def put(self, video_id: str, playable: str, data: dict, used):
+        """Store a resolution result, evicting the least recently used entry."""
+        if self.max_entries <= 0:
+            return
+        entry = trim_resolved(playable, data)
+        entry['used'] = used
+        entry['expires_at'] = resolution_expires_at(playable, entry['duration'], used)
+        if entry['expires_at'] <= time.time():
+            return
+        self.entries[video_id] = entry
+        self.entries.move_to_end(video_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        if self.store is not None:
+            self._off_loop(self.store.put, video_id, entry)
+        self.save_soon()
+
+    def invalidate(self, video_id: str):
+        self.entries.pop(video_id, None)
+        if self.store is not None:
+            self._off_loop(self.store.delete, video_id)
+
+    @staticmethod
+    def _off_loop(fn, *args):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            fn(*args)
+            return
+        loop.run_in_executor(None, fn, *args)
+
+    def load(self):
+        """Load persisted entries, dropping any that expired while we were down."""
+        if self.store is not None:
+            pruned = self.store.prune()
+            print(f"[store] shared resolve store {self.store.path}: {self.store.count()} entries ({pruned} expired dropped)")
+            return
+        if not self.path or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except Exception as e:
+            print(f"[cache] load failed: {e}")
+            return
+        for video_id, entry in stored:
+            if isinstance(entry, dict) and entry.get('url') and self._is_live(entry):
+                self.entries[video_id] = entry
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        print(f"[cache] restored {len(self.entries)} resolved streams")
+
+    def _write(self, snapshot):
+        with self._write_lock:
+            try:
+                write_json_atomic(self.path, snapshot)
+            except Exception as e:
+                print(f"[cache] save failed: {e}")
+
+    def save_soon(self):
+        """Persist a snapshot off the event loop (no-op without a cache file)."""
+        if not self.path:
+            return
+        self._off_loop(self._write, list(self.entries.items()))
+
+    def stats(self) -> str:
+        text = f"{len(self.entries)}/{self.max_entries} entries, {self.hits} hits / {self.misses} misses"
+        if self.store is not None:
+            text += f" ({self.shared_hits} from other shards)"
+        return text
+
+
+resolve_cache = ResolveCache(
+    RESOLVE_CACHE_SIZE, RESOLVE_CACHE_FILE, SharedResolveStore(RESOLVE_STORE) if RESOLVE_STORE else None
+)
+resolve_cache.load()
+
+
+AUDIO_CACHE_FILE_RE = re.compile(r'^[A-Za-z0-9_-]{11}\.[A-Za-z0-9]+$')  # <video_id>.<ext>
+
+
+class AudioCache:
+    """Byte-budgeted LRU store of hot tracks as local audio files, keyed by video ID.
+
+    Tracks are stored once they have been played AUDIO_CACHE_MIN_PLAYS times
+    (or when pinned). Files are written to partial/ and moved into place, so
+    a crash never leaves a truncated track behind.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, min_plays: int):
+        self.directory = directory
+        self.partial_dir = os.path.join(directory, 'partial')
+        self.index_path = os.path.join(directory, 'index.json')
+        self.max_bytes = max_bytes
+        self.min_plays = min_plays
+        self.entries = {}  # video_id -> {'file', 'size', 'last_used', 'title', 'duration', 'pinned'}
+        self.plays = OrderedDict()  # video_id -> play count (bounded)
+        self.pins = set()  # pinned before being stored
+        self.downloading = set()
+        self.bytes = 0
+        self.hits = 0
+        self._lock = threading.RLock()
+        self._download_slot = asyncio.Semaphore(1)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def load(self):
+        """Create the cache directory, drop leftovers and reconcile the index with disk."""
+        if not self.enabled:
+            return
+        os.makedirs(self.partial_dir, exist_ok=True)
+        for name in os.listdir(self.partial_dir):
+            path = os.path.join(self.partial_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            stored = {}
+        except Exception as e:
+            print(f"[audiocache] index load failed: {e}")
+            stored = {}
+        for video_id, entry in stored.items():
+            path = os.path.join(self.directory, entry.get('file', ''))
+            if entry.get('file') and os.path.isfile(path):
+                entry['size'] = os.path.getsize(path)
+                self.entries[video_id] = entry
+                self.bytes += entry['size']
+        known = {e['file'] for e in self.entries.values()}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            # only <video_id>.<ext> files are ours; never touch anything else in a misconfigured directory
+            if name not in known and AUDIO_CACHE_FILE_RE.match(name) and os.path.isfile(path):
+                os.remove(path)
+        print(f"[audiocache] {len(self.entries)} tracks, {self.bytes // (1024 * 1024)} MB")
+
+    def lookup(self, video_id: str) -> dict | None:
+        """Return {'path', 'title', 'duration'} for a stored track, or None."""
+        entry = self.entries.get(video_id)
+        if entry is None:
+            return None
+        path = os.path.join(self.directory, entry['file'])
+        if not os.path.isfile(path):
+            with self._lock:
+                self._drop(video_id)
+            return None
+        entry['last_used'] = time.time()
+        self.hits += 1
+        return {'path': path, 'title': entry.get('title'), 'duration': entry.get('duration')}
+
+    def record_play(self, video_id: str) -> bool:
+        """Count a play; returns True when the track should now be stored."""
+        if not self.enabled or video_id in self.entries:
+            return False
+        self.plays[video_id] = self.plays.get(video_id, 0) + 1
+        self.plays.move_to_end(video_id)
+        while len(self.plays) > 4096:
+            self.plays.popitem(last=False)
+        return self.plays[video_id] >= self.min_plays or video_id in self.pins
+
+    def pin(self, video_id: str):
+        self.pins.add(video_id)
+        if video_id in self.entries:
+            self.entries[video_id]['pinned'] = True
+            self.save_soon()
+
+    def unpin(self, video_id: str):
+        self.pins.discard(video_id)
+        if video_id in self.entries:
+            self.entries[video_id]['pinned'] = False
+            self.save_soon()
+
+    async def fetch(self, video_id: str, url: str):
+        """Download a track into the cache in the background (one download at a time)."""
+        if not self.enabled or video_id in self.entries or video_id in self.downloading:
+            return
+        self.downloading.add(video_id)
+        background_task_context('background')
+        try:
+            async with self._download_slot:
+                await extractor_pool.run(None, lambda: self._download(video_id, url))
+        except Exception as e:
+            print(f"[audiocache] download {video_id} failed: {e}")
+        finally:
+            self.downloading.discard(video_id)
+
+    def _download(self, video_id: str, url: str):
+        os.makedirs(self.partial_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.partial_dir)
+        try:
+            opts = ytdl_format_options.copy()
+            opts.update({
+                'format': 'bestaudio[acodec=opus]/bestaudio',
+                'outtmpl': os.path.join(tmp_dir, '%(id)s.%(ext)s'),
+                'noplaylist': True,
+                'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'opus'}],
+            })
+            info = load_yt_dlp().YoutubeDL(opts).extract_info(url, download=True)
+            files = os.listdir(tmp_dir)
+            if not info or not files:
+                raise RuntimeError('nothing downloaded')
+            self._adopt(video_id, os.path.join(tmp_dir, files[0]), info.get('title'), info.get('duration'))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _adopt(self, video_id: str, src: str, title, duration) -> str | None:
+        """Move a finished file into the cache, then evict down to the byte budget.
+
+        Returns None (leaving src where it is) if the file can't fit even
+        after evicting every unpinned track.
+        """
+        ext = os.path.splitext(src)[1] or '.opus'
+        name = f"{video_id}{ext}"
+        dest = os.path.join(self.directory, name)
+        size = os.path.getsize(src)
+        with self._lock:
+            pinned = sum(e['size'] for vid, e in self.entries.items() if e.get('pinned') and vid != video_id)
+            if pinned + size > self.max_bytes:
+                print(f"[audiocache] {video_id} ({size // (1024 * 1024)} MB) doesn't fit the cache budget")
+                return None
+            os.replace(src, dest)
+            self._drop(video_id, keep_file=name)
+            self.entries[video_id] = {
+                'file': name,
+                'size': size,
+                'last_used': time.time(),
+                'title': title,
+                'duration': duration,
+                'pinned': video_id in self.pins,
+            }
+            self.bytes += size
+            self.plays.pop(video_id, None)
+            self._evict(keep=video_id)
+            self._write()
+        return dest
+
+    def adopt_download(self, data: dict) -> dict:
+        """Take ownership of a force-download fallback file and play it from the cache."""
+        if not self.enabled or not data:
+            return data
+        downloads = data.get('requested_downloads') or [{}]
+        src = data.get('filepath') or downloads[0].get('filepath') or data.get('_filename')
+        video_id = data.get('id')
+        if not src or not video_id or not os.path.isfile(src):
+            return data
+        try:
+            path = self._adopt(video_id, src, data.get('title'), data.get('duration'))
+        except OSError as e:
+            print(f"[audiocache] adopt {video_id} failed: {e}")
+            return data
+        if path is None:
+            return data
+        return {**data, 'url': path, '_filename': path}
+
+    def _drop(self, video_id: str, keep_file: str | None = None):
+        entry = self.entries.pop(video_id, None)
+        if entry is None:
+            return
+        self.bytes -= entry['size']
+        if entry['file'] != keep_file:
+            try:
+                os.remove(os.path.join(self.directory, entry['file']))
+            except OSError:
+                pass
+
+    def _evict(self, keep: str | None = None):
+        while self.bytes > self.max_bytes:
+            victims = [(e['last_used'], vid) for vid, e in self.entries.items() if not e.get('pinned') and vid != keep]
+            if not victims:
+                break
+            self._drop(min(victims)[1])
+
+    def _write(self):
+        with self._lock:
+            try:
+                write_json_atomic(self.index_path, self.entries)
+            except Exception as e:
+                print(f"[audiocache] index save failed: {e}")
+
+    def save_soon(self):
+        asyncio.get_running_loop().run_in_executor(None, self._write)
+
+    def stats(self) -> str:
+        if not self.enabled:
+            return 'off'
+        return (f"{len(self.entries)} tracks, {self.bytes // (1024 * 1024)}/{self.max_bytes // (1024 * 1024)} MB, "
+                f"{self.hits} hits, {len(self.downloading)} downloading")
+
+
+audio_cache = AudioCache(AUDIO_CACHE_DIR, AUDIO_CACHE_BYTES, AUDIO_CACHE_MIN_PLAYS)
+audio_cache.load()
+
+
+class LoudnessStore:
+    """Integrated loudness (LUFS) of played tracks, keyed by video ID and persisted as JSON.
+
+    Each track is measured once, after it is first played, by a niced
+    FFmpeg ebur128 pass over the local cache file or the stream URL. One
+    analysis runs at a time; later plays just look the gain up.
+    """
+
+    MAX_PENDING = 64
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path or None
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # video_id -> integrated loudness (LUFS)
+        self.pending = OrderedDict()  # video_id -> playable, waiting for analysis
+        self.task = None
+        self.dirty = False
+        self.failed = 0
+        self._write_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return LOUDNESS_NORMALIZE
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except Exception as e:
+            print(f"[loudness] load failed: {e}")
+            return
+        self.entries.update((vid, float(lufs)) for vid, lufs in stored.items() if isinstance(lufs, (int, float)))
+        print(f"[loudness] restored {len(self.entries)} tracks")
+
+    def gain_db(self, video_id: str | None) -> float:
+        """Gain that brings video_id to LOUDNESS_TARGET (0 when unknown or disabled)."""
+        if not self.enabled or video_id is None:
+            return 0.0
+        lufs = self.entries.get(video_id)
+        if lufs is None or lufs <= -70:
+            return 0.0  # unmeasured, or silence (ebur128's floor)
+        return min(LOUDNESS_TARGET - lufs, LOUDNESS_MAX_BOOST)
+
+    def request(self, video_id: str, playable: str):
+        """Queue video_id for analysis unless it is already known or waiting."""
+        if not self.enabled or video_id in self.entries or video_id in self.pending:
+            return
+        if len(self.pending) >= self.MAX_PENDING:
+            self.pending.popitem(last=False)  # oldest stream URL is the likeliest to have expired
+            metrics.inc('jalebi_loudness_total', outcome='dropped')
+        self.pending[video_id] = playable
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._worker())
+
+    async def _worker(self):
+        while self.pending:
+            video_id, playable = self.pending.popitem(last=False)
+            local = audio_cache.lookup(video_id)
+            source = local['path'] if local else playable
+            try:
+                lufs = await self.analyse(source)
+            except Exception as e:
+                self.failed += 1
+                metrics.inc('jalebi_loudness_total', outcome='failed')
+                print(f"[loudness] {video_id}: {e!r}")
+                continue
+            self.entries[video_id] = lufs
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
+            metrics.inc('jalebi_loudness_total', outcome='analysed')
+            self.save_soon()
+
+    async def analyse(self, source: str) -> float:
+        """Run FFmpeg's EBU R128 meter over source and return its integrated loudness."""
+        args = ['ffmpeg', '-nostdin', '-hide_banner', '-nostats']
+        if '://' in source:
+            args += ffmpeg_options['before_options'].split()
+        args += ['-i', source]
+        if '://' in source and LOUDNESS_SAMPLE_SECONDS > 0:
+            args += ['-t', str(LOUDNESS_SAMPLE_SECONDS)]
+        args += ['-vn', '-af', 'ebur128=framelog=verbose', '-f', 'null', '-']
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        if hasattr(os, 'setpriority'):
+            try:
+                os.setpriority(os.PRIO_PROCESS, proc.pid, 10)  # stay behind playback FFmpegs
+            except OSError:
+                pass  # already exited
+        try:
+            with metrics.timer('jalebi_loudness_seconds'):
+                _, stderr = await asyncio.wait_for(proc.communicate(), timeout=max(LOUDNESS_SAMPLE_SECONDS, 60) * 2)
+        except BaseException:
+            if proc.returncode is None:
+                proc.kill()
+            raise
+        found = re.findall(r'I:\s+(-?[\d.]+) LUFS', stderr.decode('utf-8', 'replace'))
+        if proc.returncode != 0 or not found:
+            raise RuntimeError(f'ffmpeg exited {proc.returncode} without a loudness summary')
+        return round(float(found[-1]), 1)
+
+    def _write(self, snapshot):
+        with self._write_lock:
+            try:
+                write_json_atomic(self.path, snapshot)
+            except Exception as e:
+                print(f"[loudness] save failed: {e}")
+
+    def save_soon(self):
+        """Persist the measurements off the event loop if they changed."""
+        if not self.path or not self.dirty:
+            return
+        self.dirty = False
+        asyncio.get_running_loop().run_in_executor(None, self._write, dict(self.entries))
+
+    def stop(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+        self.pending.clear()
+
+    def stats(self) -> str:
+        if not self.enabled:
+            return 'off'
+        return f"{len(self.entries)} tracks analysed, {len(self.pending)} pending, {self.failed} failed (target {LOUDNESS_TARGET:g} LUFS)"
+
+
+loudness = LoudnessStore(LOUDNESS_FILE, LOUDNESS_CACHE_SIZE)
+loudness.load()
+
+
+def note_track_played(url: str, playable: str | None = None):
+    """Count a play toward the audio cache and store hot or pinned tracks in the background.
+
+    Tracks without a loudness measurement are queued for analysis.
+    """
+    vid = extract_video_id(url)
+    if vid and audio_cache.record_play(vid):
+        asyncio.ensure_future(audio_cache.fetch(vid, f"https://www.youtube.com/watch?v={vid}"))
+    if vid and playable:
+        loudness.request(vid, playable)
+
+
+def normalize_query(query: str) -> str:
+    return ' '.join(query.lower().split())
+
+
+class SearchCache:
+    """LRU of normalized search query -> flat result list, with a TTL."""
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.entries = OrderedDict()  # query -> (expires_at, count_requested, results)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query: str, count: int) -> list | None:
+        """Return cached results if at least count were asked for last time."""
+        item = self.entries.get(query)
+        if item is None or item[0] <= time.time() or item[1] < count:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(query)
+        self.hits += 1
+        return item[2][:count]
+
+    def put(self, query: str, count: int, results: list):
+        if self.max_entries <= 0:
+            return
+        self.entries[query] = (time.time() + self.ttl, count, results)
+        self.entries.move_to_end(query)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> str:
+        return f"{len(self.entries)} queries, {self.hits} hits / {self.misses} misses"
+
+
+search_cache = SearchCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+
+async def search_youtube(query: str, count: int = 1) -> list:
+    """Top count results for query as [{'id', 'title', 'duration'}], from one flat ytsearchN: call.
+
+    Results are not processed per entry; resolution happens later through
+    resolve_audio(), which caches by video ID.
+    """
+    key = normalize_query(query)
+    cached = search_cache.get(key, count)
+    if cached is not None:
+        return cached
+
+    def _search(ydl):
+        info = ydl.extract_info(f"ytsearch{count}:{query}", download=False, process=False)
+        entries = itertools.islice((info or {}).get('entries') or [], count)
+        return [
+            {'id': e['id'], 'title': e.get('title') or 'Unknown', 'duration': e.get('duration')}
+            for e in entries if e and e.get('id')
+        ]
+
+    with metrics.timer('jalebi_stage_seconds', stage='search'):
+        results = await extractor_pool.run('primary', _search)
+    if results:
+        search_cache.put(key, count, results)
+    return results
+
+
+async def resolve_audio(url: str, *, use_cache: bool = True):
     """Unified resolution pipeline respecting FALLBACK_ONLY.
     Returns (playable_url, data_dict, fallback_name_or_None)
+
+    Results for YouTube videos are served from the local audio_cache, or
+    from resolve_cache while their stream URL is still valid;
+    use_cache=False forces a fresh resolution.
     """
     vid = extract_video_id(url)
+    with metrics.timer('jalebi_resolve_seconds') as timer, trace_span('resolve', video=vid or url[:80]) as span:
+        try:
+            if use_cache and vid:
+                local = audio_cache.lookup(vid)
+                if local:
+                    timer.outcome = 'audio_cache'
+                    data = {'title': local['title'] or 'Unknown', 'url': local['path'], 'duration': local['duration'],
+                            'acodec': stream_codec(local['path'], {})}
+                    return local['path'], data, None
+                cached = await resolve_cache.get(vid)
+                if cached:
+                    timer.outcome = 'resolve_cache'
+                    data = {'title': cached['title'], 'url': cached['url'], 'duration': cached['duration'],
+                            'acodec': cached.get('acodec')}
+                    return cached['url'], data, cached['used']
+            if not vid:
+                playable, data, used = await _resolve_uncached(url, vid)
+            else:
+                playable, data, used, joined = await _resolve_single_flight(url, vid)
+                if joined:
+                    timer.outcome = 'coalesced'
+                    return playable, dict(data or {}), used
+            timer.outcome = (used or 'yt-dlp').lower() if playable else 'failed'
+            return playable, data, used
+        finally:
+            if timer.outcome != 'ok':  # still 'ok' here when an exception is on its way out
+                span['source'] = timer.outcome
+
+
+_resolves_in_flight = {}  # video_id -> [task, priority, guild, waiters] other callers join instead of resolving again
+
+
+async def _resolve_and_store(url: str, vid: str):
+    playable, data, used = await _resolve_uncached(url, vid)
+    if playable:
+        resolve_cache.put(vid, playable, data, used)
+    return playable, data, used
+
+
+def _forget_flight(vid: str, task):
+    if _resolves_in_flight.get(vid, (None,))[0] is task:
+        del _resolves_in_flight[vid]
+    if not task.cancelled():
+        task.exception()  # retrieved here, so an error nobody is left to await isn't logged as unhandled
+
+
+async def _resolve_single_flight(url: str, vid: str):
+    """Resolve vid once however many callers ask at the same time; returns (playable, data, used, joined).
+
+    The resolution runs as its own task (in the first caller's extraction
+    class) and callers await it through asyncio.shield, so cancelling one
+    caller never aborts the work the others are waiting on; once the last
+    waiter is cancelled (!stop, !skip, a cleared prefetch) the shared task
+    is cancelled too, as an uncoalesced resolve would be. A caller that
+    joins at a higher priority promotes the first caller's queued
+    extraction; if the shared attempt was shed, it retries at its own.
+    """
+    priority, guild = _extraction_class.get()
+    while True:
+        entry = _resolves_in_flight.get(vid)
+        joined = entry is not None and not entry[0].done()
+        if joined:
+            task, owner_priority, owner_guild, _ = entry
+            metrics.inc('jalebi_resolve_coalesced_total')
+            if PRIORITIES.index(priority) < PRIORITIES.index(owner_priority):
+                extraction_scheduler.promote(owner_guild, owner_priority, priority)
+        else:
+            task = asyncio.create_task(_resolve_and_store(url, vid))
+            entry = [task, priority, guild, 0]
+            _resolves_in_flight[vid] = entry
+            task.add_done_callback(lambda t: _forget_flight(vid, t))
+        entry[3] += 1
+        try:
+            playable, data, used = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if entry[3] == 1:
+                task.cancel()  # nobody else is waiting for it
+            raise
+        except ExtractionShed:
+            if not joined or priority in BACKGROUND_PRIORITIES:
+                raise
+            continue  # the shared attempt was background work; try again at this caller's priority
+        finally:
+            entry[3] -= 1
+        return playable, data, used, joined
+
+
+def invidious_result(inv: dict | None):
+    """Turn an Invidious API response into (playable, data, used), or None."""
+    playable = pick_invidious_audio(inv)
+    if not playable:
+        return None
+    chosen = next((f for f in (inv.get('adaptiveFormats') or []) + (inv.get('formatStreams') or [])
+                   if f.get('url') == playable), {})
+    data = {
+        'title': inv.get('title', 'Unknown (Invidious)'),
+        'url': playable,
+        'duration': inv.get('lengthSeconds'),
+        'acodec': 'opus' if 'opus' in chosen.get('type', '') else None,
+    }
+    return playable, data, 'Invidious'
+
+
+def piped_result(piped: dict | None):
+    """Turn a Piped API response into (playable, data, used), or None."""
+    playable = pick_piped_audio(piped)
+    if not playable:
+        return None
+    chosen = next((s for s in piped.get('audioStreams') or [] if s.get('url') == playable), {})
+    data = {
+        'title': piped.get('title', 'Unknown (Piped)'),
+        'url': playable,
+        'duration': piped.get('duration'),
+        'acodec': _piped_codec(chosen),
+    }
+    return playable, data, 'Piped'
+
+
+async def _try_ytdlp(url: str):
+    data = await extract_info_safe(url, download=False)
+    if data and 'entries' in data:
+        data = data['entries'][0]
+    playable = select_playable_url(data) if data else None
+    return (playable, data, None) if playable else None
+
+
+async def _try_invidious_host(host: str, vid: str):
+    return invidious_result(await fetch_provider('invidious', host, f"/api/v1/videos/{vid}"))
+
+
+async def _try_piped_host(host: str, vid: str):
+    return piped_result(await fetch_provider('piped', host, f"/streams/{vid}"))
+
+
+async def _resolve_uncached(url: str, vid: str | None):
+    """Run the provider chain: yt-dlp, then Invidious, then Piped."""
+    if RESOLVE_RACE in ('hedge', 'all'):
+        return await _resolve_race(url, vid)
     data = None
-    used = None
     if not FALLBACK_ONLY:
         try:
             data = await extract_info_safe(url, download=False)
+        except ExtractionShed:
+            raise  # background work turned away; don't fall back to Invidious/Piped for it
         except Exception as e:
             print(f"[resolve] direct failed: {e}")
     if data and 'entries' in data:
         data = data['entries'][0]
     playable = select_playable_url(data) if data else None
-    if not playable and vid:
-        inv = invidious_api_video(vid)
-        if inv:
-            playable = pick_invidious_audio(inv)
-            if playable:
-                data = {
-                    'title': inv.get('title', 'Unknown (Invidious)'),
-                    'url': playable,
-                    'duration': inv.get('lengthSeconds'),
-                }
-                used = 'Invidious'
-    if not playable and vid:
-        piped = piped_api_video(vid)
-        if piped:
-            playable = pick_piped_audio(piped)
-            if playable:
-                data = {
-                    'title': piped.get('title', 'Unknown (Piped)'),
-                    'url': playable,
-                    'duration': piped.get('duration'),
-                }
-                used = 'Piped'
-    return playable, data, used
+    if playable:
+        return playable, data, None
+    if vid:
+        result = invidious_result(await invidious_api_video(vid))
+        if result:
+            return result
+        result = piped_result(await piped_api_video(vid))
+        if result:
+            return result
+    return None, data, None
+
+
+async def _resolve_race(url: str, vid: str | None):
+    """Race yt-dlp against every Invidious/Piped host; first usable URL wins.
+
+    In 'hedge' mode the fallbacks only start after RESOLVE_HEDGE_DELAY (or as
+    soon as yt-dlp fails); in 'all' mode everything starts immediately.
+    Losing attempts are cancelled (a yt-dlp call already running in the
+    executor finishes in the background but its result is dropped). If the
+    scheduler sheds the yt-dlp attempt, the race is abandoned and
+    ExtractionShed propagates, as in the sequential chain.
+    """
+    loop = asyncio.get_running_loop()
+    names = {}
+    pending = set()
+    if not FALLBACK_ONLY:
+        task = asyncio.ensure_future(_try_ytdlp(url))
+        names[task] = 'yt-dlp'
+        pending.add(task)
+    fallbacks_started = not vid
+
+    def start_fallbacks():
+        for host in invidious_hosts():
+            task = asyncio.ensure_future(_try_invidious_host(host, vid))
+            names[task] = f"invidious {host}"
+            pending.add(task)
+        for host in piped_hosts():
+            task = asyncio.ensure_future(_try_piped_host(host, vid))
+            names[task] = f"piped {host}"
+            pending.add(task)
+
+    if not fallbacks_started and (RESOLVE_RACE == 'all' or not pending):
+        start_fallbacks()
+        fallbacks_started = True
+    hedge_at = loop.time() + RESOLVE_HEDGE_DELAY
+    try:
+        while pending:
+            timeout = None if fallbacks_started else max(0.0, hedge_at - loop.time())
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if isinstance(task.exception(), ExtractionShed):
+                    raise task.exception()  # background work turned away; don't fall back to Invidious/Piped for it
+                if task.exception() is not None:
+                    print(f"[race] {names[task]} failed: {task.exception()!r}")
+                elif task.result():
+                    if names[task] != 'yt-dlp':
+                        print(f"[race] won by {names[task]}")
+                    return task.result()
+            if not fallbacks_started and (not pending or loop.time() >= hedge_at):
+                start_fallbacks()
+                fallbacks_started = True
+    finally:
+        for task in pending:
+            task.cancel()
+    return None, None, None
+
+
+class FirstPacketTimer:
+    """Source mixin that records the delay until the voice client pulls the first frame."""
+
+    first_audio_metric = None
+    first_audio_since = None
+    trace = None
+
+    def time_first_audio(self, metric: str, since: float):
+        self.first_audio_metric = metric
+        self.first_audio_since = since
+        self.trace = _active_trace.get()  # finished when the first frame is read
+
+    def read(self):
+        frame = super().read()
+        if self.first_audio_metric is not None:
+            now = time.perf_counter()
+            metrics.observe(self.first_audio_metric, now - self.first_audio_since)
+            self.first_audio_metric = None
+            if self.trace is not None:
+                traces.first_frame(self.trace, now)
+                self.trace = None
+        return frame
+
+
+class Prerollable:
+    """Source mixin that can buffer its first frames before playback starts.
+
+    start_preroll() reads up to max_frames from FFmpeg on a helper thread;
+    read() drains that buffer and then reads straight from FFmpeg again, so
+    at most max_frames are ever held.
+    """
 
+    _preroll = None
+    _filler = None
+    _closed = False
+    frames_played = 0
+    start_offset = 0.0  # seconds skipped by an FFmpeg seek (resumed tracks)
+
+    def start_preroll(self, max_frames: int):
+        self._preroll = Queue()
+        self._filler = threading.Thread(target=self._fill, args=(max_frames,), name='preroll', daemon=True)
+        self._filler.start()
+
+    def _fill(self, max_frames: int):
+        for _ in range(max_frames):
+            frame = super().read()
+            self._preroll.put(frame)
+            if not frame or self._closed:
+                return
+
+    def has_frames(self) -> bool:
+        """Whether read() can return without waiting on FFmpeg to start."""
+        return self._filler is None or not self._preroll.empty()
+
+    @property
+    def elapsed(self) -> float:
+        return self.start_offset + self.frames_played * 0.02
+
+    def read(self):
+        if self._closed:
+            return b''
+        if self._filler is not None:
+            if self._filler.is_alive() or not self._preroll.empty():
+                try:
+                    frame = self._preroll.get(timeout=5)
+                except Empty:
+                    frame = b''
+            else:
+                self._filler = None  # buffer drained; read FFmpeg directly from now on
+                frame = super().read()
+        else:
+            frame = super().read()
+        if frame:
+            self.frames_played += 1
+        return frame
 
-class YTDLSource(discord.PCMVolumeTransformer):
-    """YouTube audio source for Discord voice client."""
-    
-    def __init__(self, source, *, data, volume=0.5):
-        super().__init__(source, volume)
+    def cleanup(self):
+        self._closed = True
+        super().cleanup()
+
+
+class YTDLSource(FirstPacketTimer, Prerollable, audio_effects.EffectsTransformer if AUDIO_EFFECTS else discord.PCMVolumeTransformer):
+    """YouTube audio source for Discord voice client.
+
+    With AUDIO_EFFECTS the volume (and any effects) run as a batched NumPy
+    chain instead of per-frame audioop scaling.
+    """
+
+    def __init__(self, source, *, data, volume=0.5, effects=()):
+        if AUDIO_EFFECTS:
+            super().__init__(source, volume, batch=EFFECTS_BATCH_FRAMES, effects=effects)
+        else:
+            super().__init__(source, volume)
         self.data = data
         self.title = data.get('title')
         self.url = data.get('url')
         self.duration = data.get('duration')
+        self.fade_to = None  # (next source, first frame of the fade, fade length in frames)
+
+    def fade_into(self, source, frames: int):
+        """Mix source in over the last frames of this track."""
+        start = int((self.duration - self.start_offset) * 50) - frames
+        self.fade_to = (source, max(start, self.frames_played), frames)
+
+    def read(self):
+        frame = super().read()
+        fade = self.fade_to
+        if fade is None or not frame or self.frames_played < fade[1]:
+            return frame
+        source, start, frames = fade
+        if not source.has_frames():
+            return frame  # next track not ready yet; never stall the current one
+        incoming = source.read()
+        if len(incoming) != len(frame):
+            self.fade_to = None
+            return frame
+        gain = min(1.0, (self.frames_played - start) / frames)
+        return audioop.add(audioop.mul(frame, 2, 1.0 - gain), audioop.mul(incoming, 2, gain), 2)
 
     @classmethod
     async def from_url(cls, url, *, loop=None, stream=False):
         """Create audio source from YouTube URL."""
-        loop = loop or asyncio.get_event_loop()
-        data = await loop.run_in_executor(None, lambda: ytdl.extract_info(url, download=not stream))
+        def _extract(ydl):
+            data = ydl.extract_info(url, download=not stream)
+            if 'entries' in data:
+                # Take first item from a playlist
+                data = data['entries'][0]
+            return data, (data['url'] if stream else ydl.prepare_filename(data))
+
+        data, filename = await extractor_pool.run('primary' if stream else 'download', _extract)
+        return cls(discord.FFmpegPCMAudio(filename, **ffmpeg_options_for(filename)), data=data)
+
+
+def format_duration(seconds) -> str:
+    """' (m:ss)' for a known duration, '' otherwise."""
+    if not seconds:
+        return ''
+    return f" ({int(seconds) // 60}:{int(seconds) % 60:02d})"
+
+
+class Track:
+    """A queued track. Holds IDs rather than discord objects so queued entries stay small."""
+
+    __slots__ = ('url', 'title', 'channel_id', 'requester_id', 'duration', 'resolved', 'resolved_until', 'prefetch')
+
+    def __init__(self, url, title, channel_id=None, requester_id=None):
+        self.url = url
+        self.title = title or 'Unknown'
+        self.duration = None  # seconds, once known
+        self.channel_id = channel_id
+        self.requester_id = requester_id
+        self.resolved = None  # prefetched (playable, data, used)
+        self.resolved_until = 0.0
+        self.prefetch = None  # in-flight prefetch task
+
+
+class YTDLOpusSource(FirstPacketTimer, Prerollable, discord.FFmpegOpusAudio):
+    """Opus-native source: FFmpeg copies (or gain-adjusts and encodes) Opus packets,
+    so there is no per-frame PCM scaling or libopus encode in Python."""
+
+    def __init__(self, source, *, data, volume=1.0, copy=False, start=0.0, gain_db=0.0):
+        opts = ffmpeg_options_for(source, start)
+        options = opts['options']
+        if not copy:
+            options += f' -af volume={volume * 10 ** (gain_db / 20):.3f}'
+        super().__init__(
+            source,
+            bitrate=OPUS_BITRATE,
+            codec='copy' if copy else None,
+            before_options=opts.get('before_options'),
+            options=options,
+        )
+        self.data = data
+        self.title = data.get('title')
+        self.url = data.get('url')
+        self.duration = data.get('duration')
+        self.volume = volume
+
 
-        if 'entries' in data:
-            # Take first item from a playlist
-            data = data['entries'][0]
+def player_effects(gain_db: float, start: float) -> list:
+    """Effects after the volume stage: loudness gain (limited when it boosts) and a fade-in for mid-track starts."""
+    effects = []
+    if abs(gain_db) >= 0.1:
+        effects.append(audio_effects.Gain(10 ** (gain_db / 20)))
+        if gain_db > 0:
+            effects.append(audio_effects.Limiter(LIMITER_CEILING))
+    if start > 0 and RESUME_FADE_SECONDS > 0:
+        effects.append(audio_effects.Fade(0, int(RESUME_FADE_SECONDS * 50)))
+    return effects
 
-        filename = data['url'] if stream else ytdl.prepare_filename(data)
-        return cls(discord.FFmpegPCMAudio(filename, **ffmpeg_options), data=data)
+
+def make_player(playable: str, data: dict, volume: float, start: float = 0.0, video_id: str | None = None):
+    """Build the audio source for a resolved track at the guild's volume, optionally from start seconds in.
+
+    The track's stored loudness gain (if it has been analysed) is applied
+    by the effects chain, or by FFmpeg without one. Opus copy mode stays a
+    pure passthrough and skips it.
+    """
+    gain_db = loudness.gain_db(video_id)
+    if OPUS_PASSTHROUGH:
+        copy = stream_codec(playable, data) == 'opus' and abs(volume - 1.0) < 0.005
+        player = YTDLOpusSource(playable, data=data, volume=volume, copy=copy, start=start, gain_db=gain_db)
+    elif AUDIO_EFFECTS:
+        source = discord.FFmpegPCMAudio(playable, **ffmpeg_options_for(playable, start))
+        player = YTDLSource(source, data=data, volume=volume, effects=player_effects(gain_db, start))
+    else:
+        player = YTDLSource(discord.FFmpegPCMAudio(playable, **ffmpeg_options_for(playable, start, gain_db)), data=data, volume=volume)
+    player.start_offset = start
+    return player
+
+
+class Preroll:
+    """The next track's source, started early so its first frames are ready at the swap."""
+
+    __slots__ = ('track', 'player', 'data', 'used', 'fade_from')
+
+    def __init__(self, track, player, data, used):
+        self.track = track
+        self.player = player
+        self.data = data
+        self.used = used
+        self.fade_from = None  # source currently crossfading into player
+
+    def discard(self):
+        if self.fade_from is not None:
+            self.fade_from.fade_to = None
+        self.player.cleanup()
+        metrics.inc('jalebi_preroll_total', outcome='discarded')
 
 
 class MusicQueue:
-    """Simple music queue manager."""
-    
-    def __init__(self):
-        self.queue = []
+    """Deque-backed music queue with indexed edits and cached page rendering."""
+
+    def __init__(self, guild_id=None):
+        self.guild_id = guild_id
+        self.queue = deque()
         self.current = None
+        self.prefetch_task = None
+        self.feeds = deque()
+        self.feed_task = None
+        self.volume = DEFAULT_VOLUME
+        self.preroll = None
+        self.preroll_task = None
+        self.enrich_pending = deque()  # playlist tracks waiting to be resolved ahead of playback
+        self.enrich_task = None
+        self.enriched = 0
+        self.enrich_total = 0
+        self.enrich_dropped = 0
+        self._pages = {}  # rendered !queue pages, dropped on every change
+
+    def __len__(self):
+        return len(self.queue)
+
+    def _changed(self):
+        if self._pages:
+            self._pages.clear()
+        snapshots.mark(self.guild_id)
 
     def add(self, song):
         """Add a song to the queue."""
         self.queue.append(song)
+        self._changed()
 
     def get_next(self):
         """Get the next song from the queue."""
         if self.queue:
-            self.current = self.queue.pop(0)
+            self.current = self.queue.popleft()
+            self._changed()
             return self.current
+        if self.current is not None:
+            self.current = None  # finished; nothing is playing any more
+            self._changed()
         return None
 
+    def peek(self, count: int) -> list:
+        """Return (without removing) the next count songs."""
+        return list(itertools.islice(self.queue, count))
+
+    def remove(self, index: int):
+        """Remove and return the song at 0-based index."""
+        head = self._head()
+        song = self.queue[index]
+        del self.queue[index]
+        self._changed()
+        self._head_moved(head)
+        return song
+
+    def discard(self, song) -> bool:
+        """Remove song if it is still queued; returns whether it was."""
+        head = self._head()
+        try:
+            self.queue.remove(song)
+        except ValueError:
+            return False
+        self._changed()
+        self._head_moved(head)
+        return True
+
+    def move(self, src: int, dst: int):
+        """Move the song at 0-based src so it ends up at dst."""
+        head = self._head()
+        song = self.queue[src]
+        del self.queue[src]
+        self.queue.insert(dst, song)
+        self._changed()
+        self._head_moved(head)
+        return song
+
+    def shuffle(self):
+        """Shuffle the upcoming songs in place."""
+        head = self._head()
+        songs = list(self.queue)
+        random.shuffle(songs)
+        self.queue = deque(songs)
+        self._changed()
+        self._head_moved(head)
+
+    def _head(self):
+        return self.queue[0] if self.queue else None
+
+    def _head_moved(self, head):
+        """Drop the preroll (and its crossfade) built for head once another track leads the queue."""
+        if self._head() is not head:
+            self.cancel_preroll()
+
+    def page_count(self) -> int:
+        return max(1, math.ceil(len(self.queue) / QUEUE_PAGE_SIZE))
+
+    def render_page(self, page: int) -> str:
+        """Render one 1-based page of upcoming songs (cached until the queue changes)."""
+        text = self._pages.get(page)
+        if text is None:
+            start = (page - 1) * QUEUE_PAGE_SIZE
+            lines = [
+                f"{i}. {song.title[:80]}{format_duration(song.duration)}"
+                for i, song in enumerate(itertools.islice(self.queue, start, start + QUEUE_PAGE_SIZE), start + 1)
+            ]
+            text = self._pages[page] = '\n'.join(lines)
+        return text
+
     def clear(self):
         """Clear the queue."""
+        self.cancel_prefetch()
+        self.cancel_feeds()
+        self.cancel_preroll()
+        self.cancel_enrichment()
         self.queue.clear()
         self.current = None
+        self._changed()
+
+    def cancel_prefetch(self):
+        """Cancel the background prefetch and any in-flight track resolution."""
+        if self.prefetch_task and not self.prefetch_task.done():
+            self.prefetch_task.cancel()
+        self.prefetch_task = None
+        for song in self.queue:
+            task, song.prefetch = song.prefetch, None
+            if task and not task.done():
+                task.cancel()
+
+    def cancel_feeds(self):
+        """Stop paging in the rest of any queued playlists."""
+        if self.feed_task and not self.feed_task.done():
+            self.feed_task.cancel()
+        self.feed_task = None
+        self.feeds.clear()
+
+    def take_preroll(self, song):
+        """Return the prerolled source if it belongs to song; discard it otherwise."""
+        if self.preroll_task and not self.preroll_task.done():
+            self.preroll_task.cancel()
+        self.preroll_task = None
+        preroll, self.preroll = self.preroll, None
+        if preroll is not None and song is not None and preroll.track is song:
+            metrics.inc('jalebi_preroll_total', outcome='used')
+            return preroll
+        if preroll is not None:
+            preroll.discard()
+        return None
+
+    def cancel_enrichment(self):
+        """Stop resolving playlist tracks ahead of playback."""
+        if self.enrich_task and not self.enrich_task.done():
+            self.enrich_task.cancel()
+        self.enrich_task = None
+        self.enrich_pending.clear()
+
+    def cancel_preroll(self):
+        """Stop any pre-spawned FFmpeg for the next track."""
+        self.take_preroll(None)
 
     def is_empty(self):
         """Check if queue is empty."""
@@ -397,17 +2868,404 @@ music_queues = {}
 def get_queue(guild_id):
     """Get or create a music queue for a guild."""
     if guild_id not in music_queues:
-        music_queues[guild_id] = MusicQueue()
+        music_queues[guild_id] = MusicQueue(guild_id)
     return music_queues[guild_id]
 
 
+def _track_row(track) -> list:
+    """Compact [ref, title, channel_id, requester_id, duration]; ref is the bare video ID for watch URLs."""
+    vid = extract_video_id(track.url)
+    ref = vid if vid and track.url == f"https://www.youtube.com/watch?v={vid}" else track.url
+    return [ref, track.title, track.channel_id, track.requester_id, track.duration]
+
+
+def _track_from_row(row) -> Track:
+    ref, title, channel_id, requester_id, duration = row
+    track = Track(ref if '://' in ref else f"https://www.youtube.com/watch?v={ref}", title, channel_id, requester_id)
+    track.duration = duration
+    return track
+
+
+class PlaybackSnapshots:
+    """Per-guild queue and playback position in SQLite so a restart resumes where it left off.
+
+    A guild's queue is only rewritten after it changed; guilds that are just
+    playing get a one-row position update. Rows are collected on the loop
+    (no I/O) and written by a single background thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path or None
+        self.dirty = set()  # guilds whose queue changed since the last write
+        self.saved = set()  # guilds with rows on disk
+        self.writes = 0
+        self._db = None  # opened on the writer thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='snapshot')
+
+    def mark(self, guild_id):
+        if self.path and guild_id is not None:
+            self.dirty.add(guild_id)
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, timeout=5)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS guild_state (guild_id INTEGER PRIMARY KEY, voice_channel INTEGER, '
+                'text_channel INTEGER, volume REAL, current TEXT, position REAL, saved_at REAL)'
+            )
+            self._db.execute('CREATE TABLE IF NOT EXISTS guild_queue (guild_id INTEGER PRIMARY KEY, tracks TEXT)')
+        return self._db
+
+    def capture(self):
+        """Rows for guilds that changed or are playing: (states, queues, removed)."""
+        states, queues, removed = [], [], []
+        now = time.time()
+        for guild_id, queue in list(music_queues.items()):
+            guild = bot.get_guild(guild_id)
+            voice_client = guild.voice_client if guild else None
+            dirty = guild_id in self.dirty
+            if not dirty and not (voice_client and voice_client.is_playing()):
+                continue
+            current = queue.current if voice_client else None
+            if current is None and not queue.queue:
+                if guild_id in self.saved:
+                    removed.append(guild_id)
+                    self.saved.discard(guild_id)
+                continue
+            source = voice_client.source if voice_client else None
+            position = getattr(source, 'elapsed', 0.0) if current else 0.0
+            anchor = current or queue.queue[0]
+            states.append((
+                guild_id,
+                voice_client.channel.id if voice_client and voice_client.channel else None,
+                anchor.channel_id,
+                queue.volume,
+                json.dumps(_track_row(current)) if current else None,
+                round(position, 2),
+                now,
+            ))
+            if dirty or guild_id not in self.saved:
+                queues.append((guild_id, json.dumps([_track_row(t) for t in queue.queue])))
+            self.saved.add(guild_id)
+        self.dirty.clear()
+        return states, queues, removed
+
+    def _write(self, states, queues, removed):
+        try:
+            db = self._connect()
+            with db:
+                db.executemany('INSERT OR REPLACE INTO guild_state VALUES (?, ?, ?, ?, ?, ?, ?)', states)
+                db.executemany('INSERT OR REPLACE INTO guild_queue VALUES (?, ?)', queues)
+                for guild_id in removed:
+                    db.execute('DELETE FROM guild_state WHERE guild_id = ?', (guild_id,))
+                    db.execute('DELETE FROM guild_queue WHERE guild_id = ?', (guild_id,))
+            self.writes += 1
+        except sqlite3.Error as e:
+            print(f"[snapshot] write failed: {e}")
+
+    def _read(self) -> list:
+        try:
+            rows = self._connect().execute(
+                'SELECT s.guild_id, s.voice_channel, s.text_channel, s.volume, s.current, s.position, s.saved_at, q.tracks '
+                'FROM guild_state s LEFT JOIN guild_queue q USING (guild_id)'
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"[snapshot] read failed: {e}")
+            return []
+        keys = ('guild_id', 'voice_channel', 'text_channel', 'volume', 'current', 'position', 'saved_at', 'tracks')
+        states = [dict(zip(keys, row)) for row in rows]
+        for state in states:
+            state['current'] = json.loads(state['current']) if state['current'] else None
+            state['tracks'] = json.loads(state['tracks']) if state['tracks'] else []
+        return states
+
+    async def flush(self):
+        """Write whatever changed since the last flush, off the event loop."""
+        if not self.path:
+            return
+        states, queues, removed = self.capture()
+        if states or removed:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._write, states, queues, removed)
+
+    async def load(self) -> list:
+        if not self.path:
+            return []
+        states = await asyncio.get_running_loop().run_in_executor(self._executor, self._read)
+        self.saved.update(state['guild_id'] for state in states)
+        return states
+
+    def _close_db(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def close(self):
+        if not self.path:
+            return
+        self.path = None  # later mark()/flush() calls are no-ops
+        self._executor.submit(self._close_db)
+        self._executor.shutdown(wait=True)
+
+
+snapshots = PlaybackSnapshots(SNAPSHOT_FILE)
+
+
+async def snapshot_loop():
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        try:
+            await snapshots.flush()
+        except Exception as e:
+            print(f"[snapshot] flush failed: {e!r}")
+
+
+def _collect_runtime_gauges():
+    for guild_id, queue in list(music_queues.items()):
+        yield 'jalebi_queue_depth', 'gauge', {'guild': guild_id}, len(queue)
+    yield 'jalebi_extract_running', 'gauge', {}, extraction_scheduler.running
+    for priority in PRIORITIES:
+        yield 'jalebi_extract_waiting', 'gauge', {'priority': priority}, extraction_scheduler.waiting_count(priority)
+    yield 'jalebi_extractor_threads', 'gauge', {}, extractor_pool.max_workers
+    yield 'jalebi_extractor_busy', 'gauge', {}, extractor_pool.active
+    yield 'jalebi_extractor_queued', 'gauge', {}, extractor_pool.queued
+    if process_extractor is not None:
+        yield 'jalebi_extractor_process_pending', 'gauge', {}, process_extractor.pending
+        yield 'jalebi_extractor_process_restarts_total', 'counter', {}, process_extractor.restarts
+    yield 'jalebi_resolve_cache_hits_total', 'counter', {}, resolve_cache.hits
+    yield 'jalebi_resolve_cache_misses_total', 'counter', {}, resolve_cache.misses
+    yield 'jalebi_resolve_store_hits_total', 'counter', {}, resolve_cache.shared_hits
+    yield 'jalebi_audio_cache_bytes', 'gauge', {}, audio_cache.bytes
+    for phase, seconds in startup_phases.items():
+        yield 'jalebi_startup_seconds', 'gauge', {'phase': phase}, seconds
+    for host, entry in list(provider_health.hosts.items()):
+        yield 'jalebi_provider_success_ratio', 'gauge', {'host': host}, entry['success']
+        yield 'jalebi_provider_latency_seconds', 'gauge', {'host': host}, entry['latency']
+        yield 'jalebi_provider_circuit_open', 'gauge', {'host': host}, int(provider_health.is_open(host))
+
+
+metrics.collectors.append(_collect_runtime_gauges)
+
+
+def latency_summary() -> str:
+    """p50/p95 of the main resolution stages and time-to-audio for !status."""
+    parts = []
+    for label, name, stage in (
+        ('primary', 'jalebi_stage_seconds', 'primary'),
+        ('fallback client', 'jalebi_stage_seconds', 'fallback_client'),
+        ('invidious', 'jalebi_stage_seconds', 'invidious'),
+        ('piped', 'jalebi_stage_seconds', 'piped'),
+        ('resolve', 'jalebi_resolve_seconds', None),
+        ('first audio', 'jalebi_time_to_first_audio_seconds', None),
+        ('transition', 'jalebi_transition_seconds', None),
+        ('loop lag', 'jalebi_loop_lag_seconds', None),
+    ):
+        pct = metrics.percentiles(name, stage)
+        if pct:
+            parts.append(f"{label} {pct[0]:.1f}/{pct[1]:.1f}s")
+    return ', '.join(parts) or 'no samples yet'
+
+
+async def _prefetch_worker(queue):
+    """Resolve the next PREFETCH_DEPTH queued tracks while the current one plays.
+
+    The window is re-read after every track, so one removed mid-prefetch
+    (its task cancelled by !remove) is skipped and the track that moved
+    up is picked up by this same worker.
+    """
+    background_task_context('prefetch', queue.guild_id)
+    tried = set()
+    while True:
+        song = next((s for s in queue.peek(PREFETCH_DEPTH) if s not in tried
+                     and not (s.resolved and s.resolved_until > time.time())), None)
+        if song is None:
+            return
+        tried.add(song)
+        task = asyncio.ensure_future(resolve_audio(song.url))
+        song.prefetch = task
+        try:
+            await asyncio.wait({task})  # unlike await, a cancelled per-track task doesn't end the worker
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            song.prefetch = None
+        if task.cancelled():
+            continue
+        try:
+            playable, data, used = task.result()
+        except Exception as e:
+            print(f"[prefetch] {song.title} failed: {e}")
+            continue
+        if playable:
+            song.resolved = (playable, trim_resolved(playable, data), used)
+            song.resolved_until = resolution_expires_at(playable, data.get('duration'), used)
+
+
+def schedule_prefetch(queue):
+    """Start the guild's prefetch worker unless one is already running."""
+    if PREFETCH_DEPTH <= 0 or queue.is_empty():
+        return
+    if queue.prefetch_task and not queue.prefetch_task.done():
+        return
+    queue.prefetch_task = asyncio.ensure_future(_prefetch_worker(queue))
+
+
+_enrich_slots = None
+
+
+async def _enrich_worker(queue, channel_id):
+    """Resolve pending playlist tracks, fill in their durations and drop unavailable ones.
+
+    Runs ENRICH_CONCURRENCY lanes per guild under a process-wide semaphore
+    of the same size. Extraction runs in the scheduler's 'background' class,
+    so now-playing, !play and prefetch work always go first; shed tracks are
+    retried later rather than treated as unavailable.
+    """
+    global _enrich_slots
+    background_task_context('background', queue.guild_id)
+    if _enrich_slots is None:
+        _enrich_slots = asyncio.Semaphore(max(1, ENRICH_CONCURRENCY))
+    message = await announce(channel_id, f"🔎 Checking playlist tracks: 0/{queue.enrich_total}")
+    last_report = time.monotonic()
+
+    async def report(final=False):
+        nonlocal last_report
+        if message is None or (not final and time.monotonic() - last_report < 5):
+            return
+        last_report = time.monotonic()
+        if final:
+            text = f"✅ Checked {queue.enriched} playlist tracks"
+        else:
+            text = f"🔎 Checking playlist tracks: {queue.enriched}/{queue.enrich_total}"
+        if queue.enrich_dropped:
+            text += f" ({queue.enrich_dropped} unavailable removed)"
+        try:
+            await message.edit(content=text)
+        except Exception as e:
+            print(f"[enrich] progress update failed: {e}")
+
+    async def lane():
+        while queue.enrich_pending:
+            track = queue.enrich_pending.popleft()
+            if not (track.resolved and track.resolved_until > time.time()):
+                async with _enrich_slots:
+                    try:
+                        playable, data, used = await resolve_audio(track.url)
+                    except asyncio.CancelledError:
+                        raise
+                    except ExtractionShed:
+                        queue.enrich_pending.append(track)
+                        await asyncio.sleep(1)
+                        continue
+                    except Exception as e:
+                        print(f"[enrich] {track.title} failed: {e}")
+                        playable = None
+                if playable:
+                    track.resolved = (playable, trim_resolved(playable, data), used)
+                    track.resolved_until = resolution_expires_at(playable, data.get('duration'), used)
+                    track.duration = data.get('duration')
+                    queue._changed()
+                elif queue.discard(track):
+                    queue.enrich_dropped += 1
+                    guild = bot.get_guild(queue.guild_id)
+                    restart_preroll(queue, guild.voice_client if guild else None)  # in case it was the head
+            queue.enriched += 1
+            await report()
+
+    while True:
+        await asyncio.gather(*(lane() for _ in range(max(1, ENRICH_CONCURRENCY))))
+        await report(final=True)
+        if not queue.enrich_pending:  # tracks may have been added during the final report
+            return
+
+
+def schedule_enrichment(queue, tracks, channel_id):
+    """Queue tracks for ahead-of-playback resolution (full playlist mode)."""
+    if not (queue.enrich_task and not queue.enrich_task.done()):
+        queue.enriched = queue.enrich_total = queue.enrich_dropped = 0
+    for track in tracks:
+        queue.enrich_pending.append(track)
+        queue.enrich_total += 1
+    if queue.enrich_pending and not (queue.enrich_task and not queue.enrich_task.done()):
+        queue.enrich_task = asyncio.ensure_future(_enrich_worker(queue, channel_id))
+
+
+async def _playlist_feed_worker(queue):
+    """Pull playlist pages until every feed reached its target, announcing each playlist once."""
+    background_task_context('prefetch', queue.guild_id)
+    while True:
+        for feed in list(queue.feeds):
+            if (feed.exhausted or feed.added >= feed.target) and not feed.announced:
+                feed.announced = True
+                more = '' if feed.exhausted else ' (more will load as the queue plays)'
+                await announce(feed.channel_id, f"📝 Added **{feed.added}** tracks from playlist: **{feed.title}**{more}")
+            if feed.exhausted and feed.announced:
+                queue.feeds.remove(feed)
+        feed = next((f for f in queue.feeds if not f.exhausted and f.added < f.target), None)
+        if feed is None:
+            return
+        try:
+            await feed.pull(queue, feed.target - feed.added)
+        except Exception as e:
+            print(f"[playlist] paging {feed.title} failed: {e}")
+            feed.exhausted = True
+        schedule_prefetch(queue)
+
+
+def schedule_playlist_feed(queue):
+    """Page in more playlist entries when the queue runs low."""
+    if not queue.feeds:
+        return
+    if len(queue.queue) < PLAYLIST_LOW_WATER:
+        feed = next((f for f in queue.feeds if not f.exhausted), None)
+        if feed and feed.added >= feed.target:
+            feed.target += MAX_PLAYLIST_ITEMS
+    if queue.feed_task and not queue.feed_task.done():
+        return
+    queue.feed_task = asyncio.ensure_future(_playlist_feed_worker(queue))
+
+
+async def announce(channel_id, message: str):
+    """Send a message to a text channel by ID (queued tracks don't keep a ctx)."""
+    channel = bot.get_channel(channel_id) if channel_id else None
+    if channel is not None:
+        return await channel.send(message)
+    return None
+
+
+async def take_prefetched(song):
+    """Return the prefetched (playable, data, used) for song if still valid, else None.
+
+    Waits for a resolution of this exact track that is already in flight
+    instead of starting a second one.
+    """
+    task, song.prefetch = song.prefetch, None
+    if task is not None and not task.done():
+        priority, guild = _extraction_class.get()
+        extraction_scheduler.promote(guild, 'prefetch', priority)
+        with trace_span('prefetch_wait'):
+            await asyncio.wait({task})
+    resolved, song.resolved = song.resolved, None
+    if not resolved and task is not None and task.done() and not task.cancelled() and not task.exception():
+        resolved = task.result()
+        if resolved[0]:
+            song.resolved_until = resolution_expires_at(resolved[0], resolved[1].get('duration'), resolved[2])
+    if not resolved or not resolved[0]:
+        return None
+    if song.resolved_until <= time.time():
+        return None  # URL expired while waiting in the queue; re-resolve
+    return resolved
+
+
 @bot.event
 async def on_ready():
     """Event handler for when the bot is ready."""
     print(f'{bot.user} has connected to Discord!')
     print(f'Bot is in {len(bot.guilds)} guilds')
-    ytdlp_version = getattr(yt_dlp, '__version__', getattr(getattr(yt_dlp, 'version', None), '__version__', 'unknown'))
-    print(f'yt-dlp version: {ytdlp_version} | Python: {platform.python_version()}')
+    if bot.shard_count:
+        print(f'Shards: {sorted(getattr(bot, "shard_ids", None) or [bot.shard_id])} of {bot.shard_count}')
     print(f'Cookies loaded: {COOKIES_LOADED} | Critical missing: {COOKIE_MISSING_CRITICAL} | Found: {sorted(CRITICAL_COOKIES_FOUND)} | Size: {COOKIE_FILE_SIZE} bytes')
     print(f'Invidious host: {INVIDIOUS_HOST}')
     if not COOKIES_LOADED:
@@ -416,6 +3274,95 @@ async def on_ready():
         print('NOTICE: Some critical cookies missing; consider exporting with browser extension for full set.')
     if FALLBACK_ONLY:
         print('FALLBACK_ONLY active: using Invidious/Piped only.')
+    if 'ready' not in startup_phases:  # on_ready also fires after reconnects
+        mark_startup('ready')
+        bot.warmup_task = asyncio.create_task(warm_up_extractors())
+        bot.restore_task = asyncio.create_task(restore_playback())
+
+
+async def warm_up_extractors():
+    """After the first on_ready: import yt-dlp, build the pooled extractors and run a test resolve.
+
+    The test resolve (same video as !pingyt) fills yt-dlp's player-JS and
+    signature cache so the first !play after a deploy doesn't pay for it.
+    """
+    loop = asyncio.get_running_loop()
+    background_task_context('background')
+    try:
+        await loop.run_in_executor(None, load_yt_dlp)
+        mark_startup('yt_dlp_import')
+        print(f'yt-dlp version: {ytdlp_version()} | Python: {platform.python_version()}')
+        if process_extractor is not None:
+            process_extractor.warm()
+        else:
+            await asyncio.gather(*(extractor_pool.run(variant, lambda ydl: None) for variant in EXTRACTOR_VARIANTS))
+        mark_startup('extractors_warm')
+        if WARMUP_RESOLVE:
+            playable, _, used = await resolve_audio(f'https://www.youtube.com/watch?v={PROBE_VIDEO_ID}', use_cache=False)
+            mark_startup('test_resolve')
+            print(f"[startup] test resolve: {'resolved:' + (used or 'direct') if playable else 'failed'}")
+    except Exception as e:
+        print(f"[startup] warm-up failed: {e!r}")
+
+
+class GuildContext:
+    """Stand-in for commands.Context when play_next() drives a guild no command started (restores)."""
+
+    def __init__(self, guild):
+        self.guild = guild
+
+    @property
+    def voice_client(self):
+        return self.guild.voice_client
+
+
+async def _resume_guild(guild, state, current):
+    """Rejoin the saved voice channel and continue current from the saved position."""
+    channel = guild.get_channel(state['voice_channel']) if state['voice_channel'] else None
+    if channel is None or not any(not m.bot for m in channel.members):
+        return False  # nobody left to listen; keep the queue for the next !play
+    try:
+        await channel.connect()
+    except Exception as e:
+        print(f"[snapshot] {guild.id}: rejoin failed: {e!r}")
+        return False
+    position = state['position'] if current and current.duration and state['position'] < current.duration - 5 else 0.0
+    if current is not None:
+        await announce(state['text_channel'], f"🔁 Back after a restart, resuming from {int(position) // 60}:{int(position) % 60:02d}")
+    await play_next(GuildContext(guild), start_at=position)
+    return True
+
+
+async def restore_playback():
+    """After the first on_ready: rebuild saved queues and resume guilds whose listeners are still there.
+
+    Queued tracks come back unresolved, so only the track being resumed is
+    extracted now (at 'now' priority, through the scheduler); the rest
+    resolve lazily through the normal prefetch as they come up.
+    """
+    states = await snapshots.load()
+    resumes = []
+    for state in states:
+        guild = bot.get_guild(state['guild_id'])
+        if guild is None:
+            continue  # served by another shard process
+        queue = get_queue(guild.id)
+        if time.time() - state['saved_at'] > SNAPSHOT_MAX_AGE or queue.current or queue.queue:
+            queue._changed()  # stale (or already in use since startup): the next flush replaces the rows
+            continue
+        queue.volume = state['volume']
+        current = _track_from_row(state['current']) if state['current'] else None
+        queue.queue.extend(_track_from_row(row) for row in state['tracks'])
+        if current is not None:
+            queue.queue.appendleft(current)
+        queue._changed()
+        resumes.append(_resume_guild(guild, state, current))
+    results = await asyncio.gather(*resumes, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"[snapshot] resume failed: {result!r}")
+    if states:
+        print(f"[snapshot] restored {len(resumes)} queues, resumed {sum(r is True for r in results)}")
 
 
 @bot.event
@@ -472,17 +3419,24 @@ async def leave(ctx):
 @bot.command(name='play', help='Plays music from YouTube (URL or search query)')
 async def play(ctx, *, url):
     """Play music from YouTube."""
+    requested_at = time.perf_counter()
+    _extraction_class.set(('play', ctx.guild.id))  # task-local: each command runs in its own task
     if not ctx.message.author.voice:
         await ctx.send("You need to be in a voice channel to play music!")
         return
+    # Time from the message being sent to this handler (clamped against clock skew)
+    lead = min(max((discord.utils.utcnow() - ctx.message.created_at).total_seconds(), 0.0), 30.0)
+    trace = traces.start('play', ctx.guild.id, url, lead=lead)
+    trace.add('command', trace.origin, lead, user=ctx.author.id)
 
     channel = ctx.message.author.voice.channel
 
     # Join the channel if not already connected
-    if ctx.voice_client is None:
-        await channel.connect()
-    elif ctx.voice_client.channel != channel:
-        await ctx.voice_client.move_to(channel)
+    with trace_span('voice_connect'):
+        if ctx.voice_client is None:
+            await channel.connect()
+        elif ctx.voice_client.channel != channel:
+            await ctx.voice_client.move_to(channel)
     
     # Clean YouTube Music URLs - remove auto-playlist parameters
     if 'music.youtube.com' in url and '&list=' in url:
@@ -495,62 +3449,189 @@ async def play(ctx, *, url):
             is_playlist_url = ('/playlist?' in url) or ('youtube.com/watch' in url and 'list=' in url and 'RDAMVM' not in url)
 
             if is_playlist_url:
-                # Fetch playlist shell without processing full metadata
-                data = await extract_info_safe(url, download=False, process=False)
+                # Fetch playlist shell without processing full metadata; entries stay lazy
+                data = await open_playlist(url)
                 if data and 'entries' in data:
-                    entries = data['entries']
-                    playlist_title = data.get('title', 'playlist')
                     queue = get_queue(ctx.guild.id)
-                    added = await enqueue_playlist_fast(entries, ctx, queue) if FAST_PLAYLIST_MODE else 0
-                    if not FAST_PLAYLIST_MODE:
-                        # Full metadata mode: extract each (slow)
-                        for entry in entries[:MAX_PLAYLIST_ITEMS]:
-                            if not entry:
-                                continue
-                            video_id = entry.get('id')
-                            url_single = f"https://www.youtube.com/watch?v={video_id}" if video_id else entry.get('webpage_url')
-                            queue.add({'url': url_single, 'title': entry.get('title') or 'Unknown', 'ctx': ctx})
-                        added = min(len(entries), MAX_PLAYLIST_ITEMS)
-                    await ctx.send(f"📝 Added **{added}** tracks from playlist: **{playlist_title}**")
-                    if not ctx.voice_client.is_playing():
-                        await play_next(ctx)
+                    feed = PlaylistFeed(data['entries'], data.get('title', 'playlist'), ctx.channel.id, ctx.author.id)
+                    queue.feeds.append(feed)
+                    start_now = not ctx.voice_client.is_playing() and queue.is_empty()
+                    # Start on the first usable entry; the rest is paged in while it resolves
+                    while start_now and queue.is_empty() and not feed.exhausted:
+                        await feed.pull(queue, 1)
+                    schedule_playlist_feed(queue)
+                    if start_now:
+                        await play_next(ctx, requested_at=requested_at)
+                    else:
+                        traces.finish(trace, 'queued', tracks=len(queue))
                     return
+            if '://' not in url and not extract_video_id(url):
+                # Free-text query: flat search (cached) for the ID, then the normal cached resolution
+                with trace_span('search'):
+                    results = await search_youtube(url, 1)
+                if not results:
+                    raise Exception('No search results found')
+                url = f"https://www.youtube.com/watch?v={results[0]['id']}"
             # Single video resolution via unified pipeline
             playable, data, used = await resolve_audio(url)
             if not playable:
                 raise Exception('No playable audio format found (providers failed)')
-            player = YTDLSource(discord.FFmpegPCMAudio(playable, **ffmpeg_options), data=data)
+            queue = get_queue(ctx.guild.id)
             if ctx.voice_client.is_playing():
-                queue = get_queue(ctx.guild.id)
-                queue.add({'url': url, 'title': player.title, 'ctx': ctx})
+                title = data.get('title') or 'Unknown'
+                queue.add(Track(url, title, ctx.channel.id, ctx.author.id))
+                traces.finish(trace, 'queued', position=len(queue))
+                schedule_prefetch(queue)
                 suffix = f" (fallback:{used})" if used else ""
-                await ctx.send(f'Added to queue: **{player.title}**{suffix}')
+                await ctx.send(f'Added to queue: **{title}**{suffix}')
             else:
+                with trace_span('ffmpeg_spawn'):
+                    player = make_player(playable, data, queue.volume, video_id=extract_video_id(url))
+                player.time_first_audio('jalebi_time_to_first_audio_seconds', requested_at)
                 ctx.voice_client.play(player, after=lambda e: asyncio.run_coroutine_threadsafe(play_next(ctx), bot.loop))
+                queue.current = Track(url, player.title, ctx.channel.id, ctx.author.id)
+                note_track_played(url, playable)
+                schedule_prefetch(queue)
+                schedule_preroll(queue, player, ctx.voice_client)
                 prefix = 'Now playing' if not used else f'Now playing ({used} fallback)'
                 await ctx.send(f'{prefix}: **{player.title}**')
         except Exception as e:
+            traces.finish(trace, 'error', error=str(e)[:120])
+            print(f"[trace {trace.id}] play failed: {e!r}")
             await ctx.send(f'⚠️ Error: {str(e)[:120]}')
             traceback.print_exc()
 
 
-async def play_next(ctx):
-    """Play the next song in the queue."""
+async def _preroll_worker(queue, current, voice_client):
+    """Start the next track's FFmpeg shortly before current ends so the swap is instant."""
+    background_task_context('now', queue.guild_id)
+    lead = max(PREROLL_SECONDS, CROSSFADE_FRAMES / 50)
+    while True:
+        if voice_client.source is not current:
+            return
+        remaining = current.duration - current.elapsed
+        if remaining <= lead:
+            break
+        await asyncio.sleep(min(remaining - lead, 5))
+
+    upcoming = queue.peek(1)
+    if not upcoming:
+        return
+    track = upcoming[0]
+    try:
+        resolved = await take_prefetched(track)
+        playable, data, used = resolved or await resolve_audio(track.url)
+    except Exception as e:
+        print(f"[preroll] {track.url}: {e}")
+        return
+    if not playable or voice_client.source is not current or queue.peek(1) != [track]:
+        return
+    player = make_player(playable, data, queue.volume, video_id=extract_video_id(track.url))
+    player.start_preroll(PREROLL_FRAMES)
+    queue.preroll = Preroll(track, player, data, used)
+    if CROSSFADE_FRAMES and isinstance(current, YTDLSource) and isinstance(player, YTDLSource):
+        current.fade_into(player, CROSSFADE_FRAMES)
+        queue.preroll.fade_from = current
+
+
+def restart_preroll(queue, voice_client):
+    """Preroll the new head after a queue edit dropped the old one."""
+    if queue.preroll_task is None and voice_client and voice_client.source is not None:
+        schedule_preroll(queue, voice_client.source, voice_client)
+
+
+def schedule_preroll(queue, player, voice_client):
+    """Arrange for the track after player to be pre-spawned near its end."""
+    if PREROLL_SECONDS <= 0 or not player.duration:
+        return
+    if queue.preroll_task and not queue.preroll_task.done():
+        queue.preroll_task.cancel()
+    queue.preroll_task = asyncio.create_task(_preroll_worker(queue, player, voice_client))
+
+
+async def play_next(ctx, requested_at: float | None = None, start_at: float = 0.0):
+    """Play the next song in the queue.
+
+    requested_at is set when a !play command started this track, so the
+    delay is recorded as time-to-first-audio rather than a track transition.
+    start_at seeks into the track (used when resuming after a restart).
+    """
+    started_at = time.perf_counter()
     queue = get_queue(ctx.guild.id)
+    _extraction_class.set(('now', ctx.guild.id))
     next_song = queue.get_next()
-    
+    preroll = queue.take_preroll(next_song if ctx.voice_client else None)
+    schedule_playlist_feed(queue)
+
     if next_song and ctx.voice_client:
+        trace = _active_trace.get()
+        if trace is None or trace.finished:  # transitions get their own trace; !play passes its one down
+            trace = traces.start('play_next', ctx.guild.id, next_song.url)
+        trace_event('track', title=next_song.title[:80])
         try:
-            playable, data, used = await resolve_audio(next_song['url'])
-            if not playable:
-                raise Exception('No playable format found (providers failed)')
-            player = YTDLSource(discord.FFmpegPCMAudio(playable, **ffmpeg_options), data=data)
+            if preroll is not None:
+                player, data, used = preroll.player, preroll.data, preroll.used
+                trace_event('preroll_used')
+            else:
+                resolved = await take_prefetched(next_song)
+                if resolved:
+                    trace_event('prefetched')
+                playable, data, used = resolved or await resolve_audio(next_song.url)
+                if not playable:
+                    raise Exception('No playable format found (providers failed)')
+                with trace_span('ffmpeg_spawn'):
+                    player = make_player(playable, data, queue.volume, start_at, extract_video_id(next_song.url))
+            if requested_at is not None:
+                player.time_first_audio('jalebi_time_to_first_audio_seconds', requested_at)
+            else:
+                player.time_first_audio('jalebi_transition_seconds', started_at)
             ctx.voice_client.play(player, after=lambda e: asyncio.run_coroutine_threadsafe(play_next(ctx), bot.loop))
+            note_track_played(next_song.url, player.url)
+            schedule_prefetch(queue)
+            schedule_preroll(queue, player, ctx.voice_client)
             tag = f" ({used} fallback)" if used else ""
-            await next_song['ctx'].send(f"Now playing{tag}: **{data.get('title', 'Unknown')}**")
+            await announce(next_song.channel_id, f"Now playing{tag}: **{data.get('title', 'Unknown')}**")
         except Exception as e:
-            await next_song['ctx'].send(f"⚠️ Skipped: {next_song.get('title','Unknown')} - {str(e)[:90]}")
-            await play_next(ctx)
+            trace_event('skipped', error=str(e)[:120])
+            print(f"[trace {trace.id}] skipped {next_song.url}: {e!r}")
+            await announce(next_song.channel_id, f"⚠️ Skipped: {next_song.title} - {str(e)[:90]}")
+            await play_next(ctx, requested_at)
+    else:
+        traces.finish(_active_trace.get(), 'queue_empty')  # e.g. every remaining track was skipped
+
+
+@bot.command(name='search', help='Searches YouTube and lets you pick a result by number')
+async def search(ctx, *, query):
+    """Show the top results for a query and play the one picked by number."""
+    _extraction_class.set(('play', ctx.guild.id))
+    try:
+        results = await search_youtube(query, SEARCH_RESULTS)
+    except Exception as e:
+        await ctx.send(f'⚠️ Search failed: {str(e)[:120]}')
+        return
+    if not results:
+        await ctx.send("No results found!")
+        return
+
+    lines = []
+    for i, result in enumerate(results, 1):
+        lines.append(f"{i}. {result['title'][:80]}{format_duration(result.get('duration'))}")
+    await ctx.send("**Search results** — reply with a number within 30s:\n" + '\n'.join(lines))
+
+    def check(message):
+        return (message.author == ctx.author and message.channel == ctx.channel
+                and message.content.strip().isdigit())
+
+    try:
+        reply = await bot.wait_for('message', check=check, timeout=30)
+    except asyncio.TimeoutError:
+        await ctx.send("Search timed out.")
+        return
+    choice = int(reply.content.strip())
+    if not 1 <= choice <= len(results):
+        await ctx.send(f"Pick a number between 1 and {len(results)}!")
+        return
+    await ctx.invoke(play, url=f"https://www.youtube.com/watch?v={results[choice - 1]['id']}")
 
 
 @bot.command(name='pause', help='Pauses the current song')
@@ -589,15 +3670,16 @@ async def stop(ctx):
 async def skip(ctx):
     """Skip the current song."""
     if ctx.voice_client and ctx.voice_client.is_playing():
+        # Every queued track still plays, so prefetches stay: play_next awaits the head's in-flight one
         ctx.voice_client.stop()
         await ctx.send("⏭️ Skipped the current song!")
     else:
         await ctx.send("No music is currently playing!")
 
 
-@bot.command(name='queue', help='Shows the current music queue')
-async def show_queue(ctx):
-    """Display the current music queue."""
+@bot.command(name='queue', help='Shows the current music queue (optionally a page number)')
+async def show_queue(ctx, page: int = 1):
+    """Display one page of the current music queue."""
     queue = get_queue(ctx.guild.id)
     
     if queue.is_empty() and not queue.current:
@@ -607,26 +3689,67 @@ async def show_queue(ctx):
     message = "**Music Queue:**\n"
     
     if queue.current:
-        message += f"Now playing: {queue.current.get('title', 'Unknown')}\n\n"
+        message += f"Now playing: {queue.current.title}\n\n"
     
     if not queue.is_empty():
-        message += "Up next:\n"
-        for i, song in enumerate(queue.queue, 1):
-            message += f"{i}. {song.get('title', 'Unknown')}\n"
+        pages = queue.page_count()
+        page = min(max(page, 1), pages)
+        message += f"Up next ({len(queue)} tracks, page {page}/{pages}):\n"
+        message += queue.render_page(page)
     else:
         message += "No songs in queue."
     
     await ctx.send(message)
 
 
+@bot.command(name='remove', help='Removes a track from the queue by its position')
+async def remove(ctx, position: int):
+    """Remove a queued track."""
+    queue = get_queue(ctx.guild.id)
+    if not 1 <= position <= len(queue):
+        await ctx.send(f"Position must be between 1 and {len(queue)}!")
+        return
+    song = queue.remove(position - 1)
+    if song.prefetch and not song.prefetch.done():
+        song.prefetch.cancel()
+    schedule_prefetch(queue)
+    restart_preroll(queue, ctx.voice_client)
+    await ctx.send(f"🗑️ Removed: **{song.title}**")
+
+
+@bot.command(name='move', help='Moves a queued track to another position')
+async def move(ctx, src: int, dst: int):
+    """Reorder the queue."""
+    queue = get_queue(ctx.guild.id)
+    if not (1 <= src <= len(queue) and 1 <= dst <= len(queue)):
+        await ctx.send(f"Positions must be between 1 and {len(queue)}!")
+        return
+    song = queue.move(src - 1, dst - 1)
+    schedule_prefetch(queue)
+    restart_preroll(queue, ctx.voice_client)
+    await ctx.send(f"↕️ Moved **{song.title}** to position {dst}")
+
+
+@bot.command(name='shuffle', help='Shuffles the queue')
+async def shuffle(ctx):
+    """Shuffle upcoming tracks."""
+    queue = get_queue(ctx.guild.id)
+    if queue.is_empty():
+        await ctx.send("The queue is empty!")
+        return
+    queue.shuffle()
+    schedule_prefetch(queue)
+    restart_preroll(queue, ctx.voice_client)
+    await ctx.send(f"🔀 Shuffled {len(queue)} tracks!")
+
+
 @bot.command(name='status', help='Shows bot playback and extraction status')
 async def status(ctx):
     queue = get_queue(ctx.guild.id)
     pending = len(queue.queue)
-    current = queue.current.get('title') if queue.current else None
-    ytdlp_version = getattr(yt_dlp, '__version__', getattr(getattr(yt_dlp, 'version', None), '__version__', 'unknown'))
+    current = queue.current.title if queue.current else None
     report = [
-        f"yt-dlp: {ytdlp_version}",
+        f"yt-dlp: {ytdlp_version()}",
         f"Python: {platform.python_version()}",
         f"Cookies loaded: {COOKIES_LOADED}",
         f"Critical cookies missing: {COOKIE_MISSING_CRITICAL}",
@@ -636,30 +3759,99 @@ async def status(ctx):
         f"Fallback only: {FALLBACK_ONLY}",
         f"Current track: {current or 'None'}",
         f"Queue length: {pending}",
-        f"Playlist mode: {'fast' if FAST_PLAYLIST_MODE else 'full'}",
+        f"Playlist mode: {'fast' if FAST_PLAYLIST_MODE else f'full ({queue.enriched}/{queue.enrich_total} checked, {queue.enrich_dropped} removed)'}",
         f"Verbose yt-dlp: {VERBOSE_YTDLP}",
+        f"Resolve cache: {resolve_cache.stats()}",
+        f"Shard: {ctx.guild.shard_id if ctx.guild else 0} of {bot.shard_count or 1}",
+        f"Extractor pool: {extractor_pool.stats()}",
+        f"Scheduler: {extraction_scheduler.stats()}",
+        f"Extractor processes: {process_extractor.stats() if process_extractor else 'off'}",
+        f"Audio cache: {audio_cache.stats()}",
+        f"Search cache: {search_cache.stats()}",
+        f"Loudness: {loudness.stats()}",
+        f"Audio effects: {f'NumPy chain, {EFFECTS_BATCH_FRAMES} frames per batch' if AUDIO_EFFECTS else 'off (per-frame volume)'}",
+        f"Providers: {provider_health.stats(fallback_hosts())}",
+        f"Loop stalls: {loop_watchdog.last_stall()}",
+        f"Startup: {', '.join(f'{phase} {seconds:.1f}s' for phase, seconds in startup_phases.items())}",
+        f"Latency p50/p95: {latency_summary()}",
     ]
     await ctx.send("Status:\n" + '\n'.join(report))
 
 
+@bot.command(name='pin', help='Keeps the current track in the local audio cache')
+async def pin(ctx):
+    """Pin the current track so it is stored locally and never evicted."""
+    queue = get_queue(ctx.guild.id)
+    vid = extract_video_id(queue.current.url) if queue.current else None
+    if not vid or not audio_cache.enabled:
+        await ctx.send("Nothing cacheable is playing!")
+        return
+    audio_cache.pin(vid)
+    if audio_cache.record_play(vid):
+        asyncio.ensure_future(audio_cache.fetch(vid, queue.current.url))
+    await ctx.send(f"📌 Pinned: **{queue.current.title}**")
+
+
+@bot.command(name='unpin', help='Lets the current track be evicted from the audio cache')
+async def unpin(ctx):
+    queue = get_queue(ctx.guild.id)
+    vid = extract_video_id(queue.current.url) if queue.current else None
+    if not vid:
+        await ctx.send("Nothing cacheable is playing!")
+        return
+    audio_cache.unpin(vid)
+    await ctx.send(f"Unpinned: **{queue.current.title}**")
+
+
 @bot.command(name='reloadcookies', help='Re-scan cookies.txt for YouTube auth cookies')
 async def reloadcookies(ctx):
     _scan_cookies()
+    extractor_pool.reset()
+    if process_extractor is not None:
+        process_extractor.reset()
     await status(ctx)
 
 @bot.command(name='pingyt', help='Test YouTube extraction health chain')
 async def pingyt(ctx):
-    test_id = 'dQw4w9WgXcQ'
-    url = f'https://www.youtube.com/watch?v={test_id}'
+    url = f'https://www.youtube.com/watch?v={PROBE_VIDEO_ID}'
     stages = []
-    playable, data, used = await resolve_audio(url)
+    playable, data, used = await resolve_audio(url, use_cache=False)
     if playable:
         stages.append(f"resolved:{used or 'direct'}")
     else:
         stages.append('failed')
+    probed = await probe_providers(fallback_hosts())
+    stages.append(f"fallback hosts up:{sum(probed.values())}/{len(probed)}")
     await ctx.send('pingyt: ' + ', '.join(stages))
 
 
+@bot.command(name='profile', help='Owner only: samples the bot for N seconds and uploads a flamegraph file')
+@commands.is_owner()
+async def profile(ctx, seconds: int = 10):
+    """Run a time-boxed sampling profile off the event loop and share the folded stacks."""
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+    await ctx.send(f"🔬 Profiling for {seconds}s...")
+    loop = asyncio.get_running_loop()
+    counts = await loop.run_in_executor(None, sample_profile, seconds)
+    path = await loop.run_in_executor(None, write_profile, counts)
+    samples = sum(counts.values())
+    message = f"Profile: {samples} samples, {len(counts)} distinct stacks → `{path}` (flamegraph.pl / speedscope)"
+    if os.path.getsize(path) < 8 * 1024 * 1024:
+        await ctx.send(message, file=discord.File(path))
+    else:
+        await ctx.send(message)
+
+
+@bot.command(name='trace', help="Shows the timing breakdown of this server's last play request (or a trace ID)")
+async def show_trace(ctx, which: str = 'last'):
+    """Show where the time went in a play/play_next request, from the command to the first frame."""
+    found = traces.latest.get(ctx.guild.id) if which == 'last' else traces.find(which)
+    if found is None or found.guild_id != ctx.guild.id:
+        await ctx.send("No trace found for this server.")
+        return
+    await ctx.send(f"```\n{found.render()[:1900]}\n```")
+
+
 @bot.command(name='volume', help='Changes the volume (0-100)')
 async def volume(ctx, volume: int):
     """Change the player volume."""
@@ -671,9 +3863,22 @@ async def volume(ctx, volume: int):
         await ctx.send("Volume must be between 0 and 100!")
         return
 
-    if ctx.voice_client.source:
-        ctx.voice_client.source.volume = volume / 100
+    queue = get_queue(ctx.guild.id)
+    queue.volume = volume / 100
+    if queue.preroll is not None:
+        if queue.preroll.player.is_opus():
+            # its FFmpeg already bakes in the old gain; pre-spawn the next track again at the new one
+            queue.cancel_preroll()
+            restart_preroll(queue, ctx.voice_client)
+        else:
+            queue.preroll.player.volume = volume / 100
+    source = ctx.voice_client.source
+    if source and not source.is_opus():
+        source.volume = volume / 100
         await ctx.send(f"🔊 Volume set to {volume}%")
+    elif source:
+        # Opus passthrough has no per-frame scaling; FFmpeg applies the gain on the next track
+        await ctx.send(f"🔊 Volume set to {volume}% (applies from the next track)")
     else:
         await ctx.send("No music is currently playing!")
 
@@ -695,4 +3900,5 @@ if __name__ == "__main__":
         print("Error: DISCORD_TOKEN not found in environment variables!")
         print("Please create a .env file with your Discord bot token.")
     else:
+        mark_startup('module')
         bot.run(TOKEN)
@@ -0,0 +1,64 @@
+"""
+JalebiJams - extraction worker process
+Runs yt-dlp in long-lived worker processes so heavy extraction work does not
+compete with the bot's voice threads for the GIL. bot.py drives it through a
+ProcessPoolExecutor and starts the workers with this module as __main__, so
+they import only yt-dlp and never re-run bot.py. Keep this module free of
+imports from bot.py.
+"""
+
+import itertools
+
+# Fields the parent needs: select_playable_url(), resolve_audio() and the playlist enqueuers
+KEEP_FIELDS = ('id', 'title', 'url', 'webpage_url', 'duration', '_filename', 'filepath', '_type', 'ie_key', 'extractor')
+KEEP_FORMAT_FIELDS = ('format_id', 'url', 'acodec', 'abr', 'ext', 'asr')
+
+_base_opts = None
+_variants = None
+_extractors = {}
+
+
+def init_worker(base_opts: dict, variants: dict):
+    """Process initializer: remember the option sets this worker serves."""
+    global _base_opts, _variants
+    _base_opts = base_opts
+    _variants = variants
+    _extractors.clear()
+
+
+def _get_extractor(variant: str):
+    ydl = _extractors.get(variant)
+    if ydl is None:
+        import yt_dlp  # imported here so the bot process can defer it (FAST_START)
+        opts = _base_opts.copy()
+        opts.update(_variants.get(variant) or {})
+        ydl = _extractors[variant] = yt_dlp.YoutubeDL(opts)
+    return ydl
+
+
+def trim_info(info, max_entries: int):
+    """Reduce a yt-dlp info dict to picklable fields the parent actually uses."""
+    if not isinstance(info, dict):
+        return info
+    out = {k: info[k] for k in KEEP_FIELDS if k in info}
+    if info.get('formats'):
+        out['formats'] = [
+            {k: f[k] for k in KEEP_FORMAT_FIELDS if k in f}
+            for f in info['formats']
+            if f.get('acodec') and f.get('acodec') != 'none' and f.get('url')
+        ]
+    if 'entries' in info:
+        out['entries'] = [trim_info(e, max_entries) for e in itertools.islice(info['entries'] or [], max_entries)]
+    return out
+
+
+def warm(variant: str) -> bool:
+    """Build the YoutubeDL instance for variant ahead of the first request."""
+    _get_extractor(variant)
+    return True
+
+
+def extract(variant: str, url: str, download: bool, process: bool, max_entries: int):
+    """Run extract_info in this worker and return the trimmed result."""
+    ydl = _get_extractor(variant)
+    return trim_info(ydl.extract_info(url, download=download, process=process), max_entries)
@@ -0,0 +1,134 @@
+"""
+JalebiJams - shard launcher
+Spreads the bot's shards over several bot.py worker processes so guilds are
+served by more than one core and gateway connection. Workers share resolved
+streams through a SQLite store (RESOLVE_STORE) and are restarted if they exit.
+
+Usage: python launcher.py
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import subprocess
+import urllib.request
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TOKEN = os.getenv('DISCORD_TOKEN')
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0'))  # total shards (0 = ask Discord)
+SHARD_PROCESSES = int(os.getenv('SHARD_PROCESSES', str(os.cpu_count() or 1)))
+RESOLVE_STORE = os.getenv('RESOLVE_STORE', os.path.join(BOT_DIR, 'resolve_store.db'))
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))  # worker i listens on METRICS_PORT + i
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', os.path.join(BOT_DIR, 'audio_cache'))
+HEALTH_FILE = os.getenv('HEALTH_FILE', os.path.join(BOT_DIR, 'provider_health.json'))  # each worker gets its own copy
+TRACE_FILE = os.getenv('TRACE_FILE', os.path.join(BOT_DIR, 'traces.jsonl'))  # each worker gets its own copy
+LOUDNESS_FILE = os.getenv('LOUDNESS_FILE', os.path.join(BOT_DIR, 'loudness.json'))  # each worker gets its own copy
+RESTART_DELAY = int(os.getenv('SHARD_RESTART_DELAY', '10'))  # seconds before a dead worker is restarted
+
+
+def recommended_shards() -> int:
+    """Ask Discord how many shards this bot should run."""
+    request = urllib.request.Request(
+        'https://discord.com/api/v10/gateway/bot',
+        headers={'Authorization': f'Bot {TOKEN}', 'User-Agent': 'JalebiJams launcher'},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return int(json.load(response)['shards'])
+
+
+def shard_ranges(shard_count: int, processes: int) -> list:
+    """Split shard IDs into contiguous, near-equal ranges, one per process."""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(range(start, end))
+        start = end
+    return ranges
+
+
+def worker_file(path: str, index: int) -> str:
+    """Worker index's own copy of a file only one process may write ('' stays off)."""
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-worker-{index}{ext}"
+
+
+def worker_env(index: int, shards: range, shard_count: int) -> dict:
+    env = os.environ.copy()
+    env.update({
+        'SHARDING': 'auto',
+        'SHARD_COUNT': str(shard_count),
+        'SHARD_IDS': f"{shards.start}-{shards.stop - 1}",
+        'RESOLVE_STORE': RESOLVE_STORE,
+        'METRICS_PORT': str(METRICS_PORT + index) if METRICS_PORT else '0',
+        # index.json is written by one process only, so each worker keeps its own audio cache
+        'AUDIO_CACHE_DIR': os.path.join(AUDIO_CACHE_DIR, f'worker-{index}'),
+        'HEALTH_FILE': worker_file(HEALTH_FILE, index),
+        'LOUDNESS_FILE': worker_file(LOUDNESS_FILE, index),
+        'TRACE_FILE': worker_file(TRACE_FILE, index),
+    })
+    env.pop('RESOLVE_CACHE_FILE', None)  # the shared store persists resolutions
+    return env
+
+
+def start_worker(index: int, shards: range, shard_count: int) -> subprocess.Popen:
+    print(f"[launcher] worker {index}: shards {shards.start}-{shards.stop - 1} of {shard_count}")
+    return subprocess.Popen(
+        [sys.executable, os.path.join(BOT_DIR, 'bot.py')],
+        cwd=BOT_DIR,
+        env=worker_env(index, shards, shard_count),
+    )
+
+
+def main():
+    if not TOKEN:
+        print("Error: DISCORD_TOKEN not found in environment variables!")
+        return 1
+    shard_count = SHARD_COUNT or recommended_shards()
+    ranges = shard_ranges(shard_count, SHARD_PROCESSES)
+    workers = [start_worker(i, shards, shard_count) for i, shards in enumerate(ranges)]
+    restart_at = {}
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while not stopping:
+        time.sleep(1)
+        for i, proc in enumerate(workers):
+            if proc.poll() is None:
+                continue
+            if i not in restart_at:
+                print(f"[launcher] worker {i} exited with {proc.returncode}; restarting in {RESTART_DELAY}s")
+                restart_at[i] = time.monotonic() + RESTART_DELAY
+            elif time.monotonic() >= restart_at[i]:
+                del restart_at[i]
+                workers[i] = start_worker(i, ranges[i], shard_count)
+
+    print("[launcher] stopping workers")
+    for proc in workers:
+        if proc.poll() is None:
+            proc.terminate()
+    for proc in workers:
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())